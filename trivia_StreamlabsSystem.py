@@ -4,14 +4,37 @@
 # ---------------------------------------
 # Libraries and references
 # ---------------------------------------
+import bisect
 import codecs
+import csv
+import functools
+import heapq
 import io
 import json
 import os
+import re
+import shutil
+import threading
 import time
+import zlib
 from datetime import datetime
 from math import ceil
 
+try:
+    import unicodedata  # Used to fold accented characters when tolerant answer matching is enabled
+except ImportError:
+    unicodedata = None
+
+try:
+    from System.IO import File as DotNetFile  # IronPython has no os.replace, but .NET can replace files in one step
+except ImportError:
+    DotNetFile = None
+
+try:
+    text_type = unicode
+except NameError:
+    text_type = str
+
 # ---------------------------------------
 # [Required] Script information
 # ---------------------------------------
@@ -57,31 +80,71 @@ Description = "Trivia Minigame"
 path_to_script = os.path.abspath(os.path.dirname(__file__))
 settings_file = os.path.join(path_to_script, "settings.json")
 questions_file = os.path.join(path_to_script, "questions.json")
+questions_journal_file = os.path.join(path_to_script, "questions.journal")
+questions_index_file = os.path.join(path_to_script, "questions.index")
+question_deck_file = os.path.join(path_to_script, "questions.deck")
 log_file = os.path.join(path_to_script, "trivialog.txt")
+rewards_ledger_file = os.path.join(path_to_script, "rewards.ledger")
+perf_report_file = os.path.join(path_to_script, "perf.json")
 current_question_file = os.path.join(path_to_script, "currentquestion.txt")
 
-master_questions_list = []  # List of all questions
-current_questions_list = []  # List of currently active questions depending on settings
-# Connects the master list to current list, required for question list modifications to work
-question_index_map = []
-
-current_question_index = -1  # Index in current_questions_list of the current question
-current_question_points = 0  # Current question points, used when random scaling is in effect
-current_game = ""  # Current game, as returned by an API call
-game_detection_override = False     # Prevents the 
-question_start_time = time.time()  # What time does the next question start?
-ready_for_next_question = True  # Boolean used when questions do not automatically start.
-readiness_notification_time = time.time()
-question_expiry_time = 0  # How many minutes questions last
-# How long should the script go between the last file update and the next file update
-next_question_file_update_time = 0
-grace_period_used = False  # Tracks if the grace period has started for this question
-
-correct_users_dict = {}  # Dictionary of users that gave correct answers, used in multi-reward mode
-
-active = True  # Is the script running?
-script_settings = None  # Settings variable
+question_store = None  # Every question, keyed by its ID. Created when questions are first loaded.
+next_question_id = 1  # ID given to the next question added
+all_questions = None  # Pool of every question ID. Created when questions are first loaded.
+game_pools = {}  # Pools of question IDs for each game, kept up to date as questions change
+game_names = {}  # Shared copies of every game name, so questions do not each hold their own copy
+
+clock = time.time  # Source of the current time for question timing. Can be replaced with a fake clock for testing.
+
+
+leaderboard_size = 5  # Number of players shown by !trivia top
+player_subcommands = ("top", "stats")  # Subcommands anyone allowed to play can use
+payout_chunk_size = 25  # Winners paid per Tick when the Chatbot cannot pay everyone at once
+payout_retry_delay_in_seconds = 30  # Delay before retrying failed payouts
+payout_attempt_limit = 5  # Payouts that fail this many times are given up on
+
+questions_file_checksum = None  # Checksum of the questions file the journal applies to
+journal_record_count = 0  # Number of changes recorded in the journal since the questions file was last written
+journal_compaction_threshold = 500  # Rewrite the questions file once the journal holds this many changes
+pending_journal_records = []  # Question changes not yet written to the journal
+next_trivia_flush_time = 0  # Earliest time pending question changes will be written to disk
+question_deck_changed = False  # Questions have been asked since the question deck file was written
+import_chunk_size = 250  # Number of imported questions processed per Tick
+
+default_game = None  # The game the Chatbot runs through Init, Execute and Tick. Created by Init.
+trivia_games = []  # Every game sharing the questions, run by Tick
+script_settings = None  # Settings of the default game, which also control logging and how questions are saved
 twitch_api_source = "https://decapi.me/twitch/game/"  # The source for getting current_game
+game_detection_timeout_in_seconds = 10  # Game lookups that take longer than this are abandoned
+game_detection_retry_delay_in_seconds = 15  # Delay before retrying a failed game lookup, doubled on each failure
+game_detection_max_retry_delay_in_seconds = 600  # Longest delay between retries of failed game lookups
+
+live_status_cache_duration_in_seconds = 10  # How long a live status check is reused
+permission_cache_duration_in_seconds = 60  # How long a permission check is reused
+permission_cache_limit = 10000  # The permission cache is emptied if it grows past this many entries
+
+log_buffer = []  # Log lines not yet written to the log file
+log_buffer_lock = threading.Lock()  # Log lines can come from the game detection thread
+log_flush_interval_in_seconds = 1  # Buffered log lines are written by Tick at most this often...
+log_buffer_limit = 500  # ...unless this many lines are waiting
+log_file_backup_count = 3  # Number of rotated log files kept, as trivialog.txt.1, trivialog.txt.2, ...
+next_log_flush_time = 0  # Earliest time buffered log lines will be written
+
+perf_timer = getattr(time, "perf_counter", None) or time.clock  # Most precise timer available, for timing only
+perf_counters = {}  # Function name: PerfCounter, for the functions that are timed
+perf_bucket_limits = (0.0001, 0.001, 0.01, 0.1, 1)  # Upper limits in seconds of every timing bucket but the last
+perf_bucket_names = ("<0.1ms", "<1ms", "<10ms", "<100ms", "<1s", ">=1s")
+
+message_template_settings = ("question_ask_string", "question_reward_string", "question_expiration_string",
+                             "question_file_ask_string", "question_file_reward_string",
+                             "question_file_expiration_string")
+# Message parameters. Longer names come first so that $pointswon is not read as $points followed by "won".
+message_parameter_pattern = re.compile(r"\$(pointswon|points|index|currency|question|answers|game|winnerspossible|"
+                                       r"winnercount|winnerlist|timeremaining|time)")
+
+answer_folding_pattern = re.compile(r"[\W_]+", re.UNICODE)  # Punctuation ignored by tolerant matching
+answer_article_pattern = re.compile(r"^(the|an|a) ")  # Leading articles ignored by tolerant matching
+minimum_typo_answer_length = 4  # Answers shorter than this must always be spelled correctly
 
 
 # ---------------------------------------
@@ -89,61 +152,85 @@ twitch_api_source = "https://decapi.me/twitch/game/"  # The source for getting c
 # ---------------------------------------
 class Settings(object):
     def __init__(self, settings_file=None):
-        if settings_file and os.path.isfile(settings_file):
-            with codecs.open(settings_file, encoding="utf-8-sig", mode="r") as f:
-                self.__dict__ = json.load(f, encoding="utf-8")
-        else:
-            # General
-            self.run_only_when_live = True
-            self.permissions_players = "Everyone"
-            self.permissions_admins = "Moderator"
-
-            # Question Settings
-            self.duration_of_questions = 5
-            self.cooldown_between_questions = 5
-            self.randomize_question_cooldown = False
-            self.question_cooldown_random_lower_bound = 0
-            self.question_cooldown_random_upper_bound = 0
-            self.automatically_run_next_question = True
-            self.question_ask_string = "Win $points $currency by answering: $index) In $game, $question"
-            self.question_reward_string = "$winnerlist answered correctly and won $points $currency."
-            self.question_expiration_string = "Nobody answered the previous question. The answers were: $answers."
-            self.question_file_ask_string = "$timeremaining) In $game, $question"
-            self.question_file_reward_string = "$winnerlist answered correctly and won $points $currency."
-            self.question_file_expiration_string = "Nobody answered the previous question. The answers were: $answers."
-
-            # Trivia Rewards
-            self.number_of_winners = 1
-            self.enable_points_dividing = True
-            self.enable_loyalty_point_rewards = True
-            self.default_loyalty_point_value = 10
-            self.reward_scaling = False
-            self.point_value_random_lower_bound = 0
-            self.point_value_random_upper_bound = 0
-            self.percent_loyalty_point_value_increase_on_unanswered = 0
-            self.percent_loyalty_point_value_decrease_on_answered = 0
-            self.enable_grace_period = False
-            self.grace_period_duration_in_seconds = 1
-
-            # Output Settings
-            self.display_next_question_time = False
-            self.create_current_question_file = False
-            self.debug_level = "Warn"
-            self.enable_file_logging = False
-
-            # Game Detection Settings
-            self.enable_game_detection = False
-            self.twitch_channel_name = ""
+        # Defaults are always applied first so that settings files written by older versions
+        #   still receive values for settings that were added later
+
+        # General
+        self.run_only_when_live = True
+        self.permissions_players = "Everyone"
+        self.permissions_admins = "Moderator"
+
+        # Question Settings
+        self.duration_of_questions = 5
+        self.cooldown_between_questions = 5
+        self.randomize_question_cooldown = False
+        self.question_cooldown_random_lower_bound = 0
+        self.question_cooldown_random_upper_bound = 0
+        self.automatically_run_next_question = True
+        self.question_ask_string = "Win $points $currency by answering: $index) In $game, $question"
+        self.question_reward_string = "$winnerlist answered correctly and won $points $currency."
+        self.question_expiration_string = "Nobody answered the previous question. The answers were: $answers."
+        self.question_file_ask_string = "$timeremaining) In $game, $question"
+        self.question_file_reward_string = "$winnerlist answered correctly and won $points $currency."
+        self.question_file_expiration_string = "Nobody answered the previous question. The answers were: $answers."
+
+        # Trivia Rewards
+        self.number_of_winners = 1
+        self.enable_points_dividing = True
+        self.enable_loyalty_point_rewards = True
+        self.default_loyalty_point_value = 10
+        self.reward_scaling = False
+        self.point_value_random_lower_bound = 0
+        self.point_value_random_upper_bound = 0
+        self.percent_loyalty_point_value_increase_on_unanswered = 0
+        self.percent_loyalty_point_value_decrease_on_answered = 0
+        self.enable_grace_period = False
+        self.grace_period_duration_in_seconds = 1
+
+        # Output Settings
+        self.display_next_question_time = False
+        self.create_current_question_file = False
+        self.question_file_refresh_interval_in_seconds = 1
+        self.debug_level = "Warn"
+        self.enable_file_logging = False
+        self.perf_report_interval_in_seconds = 0
+        self.log_file_max_size_in_kb = 1024
+        self.create_backup_files = True
+        self.save_interval_in_seconds = 30
+
+        # Game Detection Settings
+        self.enable_game_detection = False
+        self.twitch_channel_name = ""
+        self.game_detection_interval_in_seconds = 60
+
+        # Answer Matching Settings
+        self.enable_tolerant_matching = False
+        self.answer_typo_tolerance = 0
+
+        # Loading Settings
+        self.enable_lazy_loading = False
+
+        # If the settings file is missing or unreadable, fall back to the temporary file of a save that was
+        #   interrupted, then to the backup made by the previous save
+        for file_path in (settings_file, settings_file + ".tmp", settings_file + ".bak") if settings_file else ():
+            if not os.path.isfile(file_path):
+                continue
+            try:
+                with codecs.open(file_path, encoding="utf-8-sig", mode="r") as f:
+                    self.__dict__.update(json.load(f))
+                break
+            except ValueError:
+                continue
 
     def Reload(self, json_data):
-        self.__dict__ = json.loads(json_data, encoding="utf-8")
+        self.__dict__.update(json.loads(json_data))
         return
 
     def Save(self, settings_file):
         try:
-            with codecs.open(settings_file, encoding="utf-8-sig", mode="w+") as f:
-                json.dump(self.__dict__, f, encoding="utf-8")
-        except IOError as e:
+            write_file_atomically(settings_file, codecs.BOM_UTF8 + to_bytes(json.dumps(self.__dict__)),
+                                  self.create_backup_files)
+        except (IOError, OSError) as e:
             log("Settings Save: Failed to save settings to the file: "
                 + str(e), LoggingLevel.str_to_int.get("Fatal"))
             raise e
@@ -151,32 +238,35 @@ class Settings(object):
 
 
 class Question(object):
-    # Object-specific Variables
-    points = None
-    game = None
-    question = None
-    answers = []
+    # Object-specific Variables. Slots keep large question banks small: there is no per-question __dict__,
+    #   game names are shared between questions, and answers are stored as tuples.
+    __slots__ = ("id", "points", "game", "question", "answers")
 
     def __init__(self, **kwargs):
         self.points = kwargs["points"] if "points" in kwargs else script_settings.default_loyalty_point_value
-        self.game = kwargs["game"] if "game" in kwargs \
+        self.game = intern_game_name(kwargs["game"]) if "game" in kwargs \
             else Question.raise_value_error(self, "Error: No 'game' keyword was supplied.")
         self.question = kwargs["question"] if "question" in kwargs \
             else Question.raise_value_error(self, "Error, no 'question' keyword was supplied.")
-        self.answers = kwargs["answers"] if "answers" in kwargs \
+        self.answers = tuple(kwargs["answers"]) if "answers" in kwargs \
             else Question.raise_value_error(self, "Error: No 'answers' keyword was supplied.")
+        self.id = kwargs["id"] if "id" in kwargs else None
 
     def as_string(self):
         return "For " + str(self.points) + " " + Parent.GetCurrencyName() + ": In " + self.game + ", " + self.question
 
     def toJSON(self):
-        return {"Points": self.points, "Game": self.game, "Question": self.question, "Answers": self.answers}
+        return {"ID": self.id, "Points": self.points, "Game": self.game, "Question": self.question,
+                "Answers": self.answers}
+
+    def get_id(self):
+        return self.id
 
     def get_game(self):
         return self.game
 
     def set_game(self, new_game):
-        self.game = new_game
+        self.game = intern_game_name(new_game)
 
     def get_question(self):
         return self.question
@@ -194,31 +284,439 @@ class Question(object):
         return self.answers
 
     def set_answers(self, new_answers):
-        if isinstance(new_answers, list):
-            self.answers = new_answers
+        if isinstance(new_answers, (list, tuple)):
+            self.answers = tuple(new_answers)
             return True
         else:
             return False
 
     def remove_answer(self, answer):
-        try:
-            self.answers.remove(answer.lower())
-            return True
-        except ValueError:
+        if answer.lower() not in self.answers:
             return False
+        else:
+            self.answers = tuple(existing for existing in self.answers if existing != answer.lower())
+            return True
 
     def add_answer(self, answer):
         if answer.lower() in (answer.lower() for answer in self.answers):
             return False
         else:
-            self.answers.append(answer.lower())
+            self.answers = self.answers + (answer.lower(),)
             return True
 
     def raise_value_error(self, error_text):
         raise ValueError(error_text)
 
     def __str__(self):
-        return "Game: " + self.game + ", Question: " + self.question
+        return "ID: " + str(self.id) + ", Game: " + self.game + ", Question: " + self.question
+
+
+class QuestionStore(object):
+    # Every question, keyed by ID. With lazy loading, questions start out as the location of their line in
+    #   the questions file and are only read and turned into Question objects when they are first used.
+    def __init__(self, source_file):
+        self.source_file = source_file
+        self.questions = {}
+        self.unread_questions = {}  # ID: (byte offset, length, game)
+
+    def add_unread(self, question_id, offset, length, game):
+        self.unread_questions[question_id] = (offset, length, game)
+
+    def get_game(self, question_id):
+        if question_id in self.questions:
+            return self.questions[question_id].get_game()
+        return self.unread_questions[question_id][2]
+
+    def get_raw(self, question_id, source_data):
+        # The question's JSON as it should be written to the questions file. Unread questions are copied
+        #   from source_data, the current contents of the questions file.
+        if question_id in self.questions:
+            return to_bytes(json.dumps(self.questions[question_id].toJSON()))
+        offset, length, game = self.unread_questions[question_id]
+        return source_data[offset:offset + length]
+
+    def relocate(self, locations):
+        # Point unread questions at their new place in a rewritten questions file
+        for question_id, offset, length, game_number in locations:
+            if question_id in self.unread_questions:
+                self.unread_questions[question_id] = (offset, length, self.unread_questions[question_id][2])
+
+    def __getitem__(self, question_id):
+        if question_id in self.questions:
+            return self.questions[question_id]
+        offset, length, game = self.unread_questions[question_id]
+        with open(self.source_file, 'rb') as infile:
+            infile.seek(offset)
+            question = question_from_json(json.loads(infile.read(length).decode("utf-8")))
+        question.id = question_id
+        del self.unread_questions[question_id]
+        self.questions[question_id] = question
+        return question
+
+    def __setitem__(self, question_id, question):
+        self.unread_questions.pop(question_id, None)
+        self.questions[question_id] = question
+
+    def get(self, question_id, default=None):
+        return self[question_id] if question_id in self else default
+
+    def pop(self, question_id):
+        question = self[question_id]
+        del self.questions[question_id]
+        return question
+
+    def __contains__(self, question_id):
+        return question_id in self.questions or question_id in self.unread_questions
+
+    def __iter__(self):
+        for question_id in self.questions:
+            yield question_id
+        for question_id in self.unread_questions:
+            yield question_id
+
+    def __len__(self):
+        return len(self.questions) + len(self.unread_questions)
+
+
+class QuestionImport(object):
+    # Adds questions from a CSV, JSON lines or JSON array file, a chunk at a time. Questions that are
+    #   invalid or that already exist (same game and question text) are skipped. Nothing is written to disk
+    #   until the import finishes, when every question is saved at once. Questions without a game or points
+    #   are given the defaults supplied by the game running the import.
+    def __init__(self, file_path, default_game="", default_points=None):
+        if os.path.splitext(file_path)[1].lower() not in (".csv", ".jsonl", ".jsonlines", ".json"):
+            raise ValueError("Unsupported file type. Use .csv, .jsonl or .json.")
+        self.file_path = file_path
+        self.default_game = default_game
+        self.default_points = default_points if default_points is not None \
+            else script_settings.default_loyalty_point_value
+        self.records = read_question_file(file_path)
+        self.fingerprints = None  # Built by the first chunk, so starting an import from chat stays quick
+        self.added = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.finished = False
+
+    def process(self, limit):
+        # Import up to limit questions. Returns True once the whole file has been processed.
+        if self.fingerprints is None:
+            self.fingerprints = get_question_fingerprints()
+        for record in self.records:
+            try:
+                question = question_from_import(record, self.default_game, self.default_points)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                self.invalid = self.invalid + 1
+                log("QuestionImport: Skipping invalid question " + str(self.added + self.duplicates + self.invalid)
+                    + ": " + str(e), LoggingLevel.str_to_int.get("Debug"))
+            else:
+                fingerprint = get_question_fingerprint(question.get_game(), question.get_question())
+                if fingerprint in self.fingerprints:
+                    self.duplicates = self.duplicates + 1
+                else:
+                    self.fingerprints.add(fingerprint)
+                    add_question(question)
+                    self.added = self.added + 1
+            limit = limit - 1
+            if limit <= 0:
+                return False
+        self.finished = True
+        if self.added > 0:
+            save_trivia()
+        return True
+
+    def close(self):
+        self.records.close()
+
+    def __str__(self):
+        return str(self.added) + " added, " + str(self.duplicates) + " duplicates skipped, " \
+            + str(self.invalid) + " invalid questions skipped"
+
+
+class UserStats(object):
+    # Totals for one user. Kept for every user who has ever won, so slots keep them small.
+    __slots__ = ("user_id", "username", "wins", "points", "fastest_answer", "streak", "best_streak")
+
+    def __init__(self, user_id, username):
+        self.user_id = user_id
+        self.username = username
+        self.wins = 0
+        self.points = 0
+        self.fastest_answer = None  # Seconds, or None if no answer has been timed
+        self.streak = 0  # Questions won in a row
+        self.best_streak = 0
+
+    def get_rank_key(self):
+        # Sorts users by wins, then by points, most first
+        return -self.wins, -self.points, self.user_id
+
+
+class QuestionPool(object):
+    # A set of question IDs that supports adding, removing and drawing a random ID in constant time.
+    #   IDs not yet drawn this round are kept before the IDs already drawn, like a shuffled deck of cards, so
+    #   no ID is drawn twice until every ID has been. Moving IDs between the two parts swaps them with the
+    #   ID at the boundary, so the order of IDs within each part is not meaningful.
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+        self.undrawn = 0  # Number of IDs not yet drawn this round, which are kept at the front
+        self.last_drawn = None  # ID most recently marked as drawn, avoided at the start of the next round
+
+    def add(self, question_id):
+        # New IDs have not been drawn yet
+        if question_id not in self.positions:
+            self.positions[question_id] = len(self.ids)
+            self.ids.append(question_id)
+            self.swap(len(self.ids) - 1, self.undrawn)
+            self.undrawn = self.undrawn + 1
+
+    def discard(self, question_id):
+        position = self.positions.get(question_id)
+        if position is None:
+            return
+        if position < self.undrawn:
+            self.undrawn = self.undrawn - 1
+            self.swap(position, self.undrawn)
+            position = self.undrawn
+        self.swap(position, len(self.ids) - 1)
+        self.ids.pop()
+        del self.positions[question_id]
+
+    def swap(self, first, second):
+        first_id = self.ids[first]
+        second_id = self.ids[second]
+        self.ids[first] = second_id
+        self.ids[second] = first_id
+        self.positions[first_id] = second
+        self.positions[second_id] = first
+
+    def pick(self, random_position):
+        # Pick an ID that has not been drawn this round, starting a new round once every ID has been drawn.
+        #   The ID stays undrawn until it is marked as drawn. random_position(count) returns a random position
+        #   below count. The last ID drawn is avoided if possible, so a new round never starts with a repeat.
+        if not self.ids:
+            return None
+        if self.undrawn == 0:
+            self.undrawn = len(self.ids)
+        position = random_position(self.undrawn)
+        if self.ids[position] == self.last_drawn and self.undrawn > 1:
+            position = (position + 1 + random_position(self.undrawn - 1)) % self.undrawn
+        return self.ids[position]
+
+    def mark_drawn(self, question_id):
+        position = self.positions.get(question_id)
+        if position is not None:
+            self.last_drawn = question_id
+        if position is not None and position < self.undrawn:
+            self.undrawn = self.undrawn - 1
+            self.swap(position, self.undrawn)
+
+    def get_drawn_ids(self):
+        return self.ids[self.undrawn:]
+
+    def __contains__(self, question_id):
+        return question_id in self.positions
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class AnswerMatcher(object):
+    # Precomputed lookup structures for one question's answers. Exact matches cost a single set lookup.
+    #   Tolerant matching also ignores case, accents, punctuation and leading articles, and typo tolerance
+    #   compares against answers of a similar length only, using an edit distance that gives up early.
+    def __init__(self, answers, tolerant=False, typo_tolerance=0):
+        self.tolerant = tolerant
+        self.typo_tolerance = max(int(typo_tolerance), 0)
+        self.exact_answers = frozenset(normalize_answer(answer) for answer in answers)
+        self.folded_answers = frozenset(fold_answer(answer) for answer in answers) if tolerant else frozenset()
+
+        # Answers eligible for typo matching, bucketed by length so a message is only compared against
+        #   answers whose length is within the typo tolerance of its own
+        self.answers_by_length = {}
+        if self.typo_tolerance > 0:
+            for answer in (self.folded_answers if tolerant else self.exact_answers):
+                if len(answer) >= minimum_typo_answer_length:
+                    self.answers_by_length.setdefault(len(answer), []).append(answer)
+
+        # Messages longer than this cannot match any answer. Tolerant matching ignores punctuation, spacing
+        #   and accents, so messages are allowed plenty of those on top of the longest answer.
+        self.longest_message = max([len(answer) for answer in self.exact_answers] or [0]) + self.typo_tolerance
+        if tolerant:
+            self.longest_message = self.longest_message * 4 + 8
+
+    def could_match(self, message):
+        # A quick check that turns away most chat messages without normalizing them
+        return len(message) <= self.longest_message or len(message.strip()) <= self.longest_message
+
+    def match(self, message):
+        normalized_message = normalize_answer(message)
+        if normalized_message in self.exact_answers:
+            return True
+        if not self.tolerant and not self.answers_by_length:
+            return False
+
+        candidate = fold_answer(normalized_message) if self.tolerant else normalized_message
+        if candidate in self.folded_answers:
+            return True
+        for length in range(len(candidate) - self.typo_tolerance, len(candidate) + self.typo_tolerance + 1):
+            for answer in self.answers_by_length.get(length, ()):
+                if within_edit_distance(candidate, answer, self.typo_tolerance):
+                    return True
+        return False
+
+
+class GameDetector(object):
+    # Looks up the streamer's current game on a background thread, so that nothing waits on the network.
+    #   The last detected game is kept until it is older than the detection interval. Lookups that fail or
+    #   time out are retried after a delay that doubles with each failure.
+    def __init__(self, settings, parent):
+        self.settings = settings  # Settings of the game the detector belongs to, for its channel name
+        self.parent = parent
+        self.lock = threading.Lock()
+        self.game = None  # Last detected game, or None if no lookup has succeeded yet
+        self.lookup = None  # Generation of the lookup in progress, or None
+        self.lookup_start_time = 0
+        self.result = None  # (generation, game) of a finished lookup, where game is None if it failed
+        self.generation = 0  # Results of lookups from an older generation are ignored
+        self.failures = 0
+        self.next_refresh_time = 0
+
+    def refresh(self, force=False):
+        # Starts a lookup if the detected game is out of date, or immediately when forced.
+        #   Returns True if a lookup is in progress.
+        channel = self.settings.twitch_channel_name
+        if channel and self.lookup is None and (force or time.time() >= self.next_refresh_time):
+            self.generation = self.generation + 1
+            self.lookup = self.generation
+            self.lookup_start_time = time.time()
+            thread = threading.Thread(target=self.run, args=(self.generation, channel))
+            thread.daemon = True
+            thread.start()
+        return self.lookup is not None
+
+    def run(self, generation, channel):
+        try:
+            game = fetch_twitch_game(self.parent, channel)
+        except Exception as e:
+            log("GameDetector: Game lookup failed: " + str(e), LoggingLevel.str_to_int.get("Warn"))
+            game = None
+        with self.lock:
+            self.result = (generation, game)
+
+    def update(self):
+        # Collects the result of a finished lookup. Returns True if a lookup ended since the last update.
+        with self.lock:
+            result = self.result
+            self.result = None
+        if result is not None and result[0] == self.lookup:
+            game = result[1]
+        elif self.lookup is not None and time.time() > self.lookup_start_time + game_detection_timeout_in_seconds:
+            log("GameDetector: Game lookup timed out.", LoggingLevel.str_to_int.get("Warn"))
+            game = None
+        else:
+            return False
+
+        self.lookup = None
+        if game is None:
+            self.failures = self.failures + 1
+            self.next_refresh_time = time.time() + min(
+                game_detection_retry_delay_in_seconds * 2 ** (self.failures - 1),
+                game_detection_max_retry_delay_in_seconds)
+        else:
+            self.game = game
+            self.failures = 0
+            self.next_refresh_time = time.time() + max(self.settings.game_detection_interval_in_seconds, 1)
+        return True
+
+    def reset(self):
+        # Forgets the detected game and ignores any lookup in progress, such as when the channel changes
+        self.generation = self.generation + 1
+        self.lookup = None
+        self.game = None
+        self.failures = 0
+        self.next_refresh_time = 0
+
+
+class MessageTemplate(object):
+    # A message string from settings, split once into plain text and $parameters so that it can be filled in
+    #   with a single pass. Only the parameters the message actually uses are worked out.
+    def __init__(self, string):
+        # Even positions hold plain text and odd positions hold parameter names
+        self.parts = message_parameter_pattern.split(string)
+        # Messages showing a countdown can only be filled in when they are shown
+        self.uses_time = bool(set(self.parts[1::2]) & set(("time", "timeremaining")))
+
+    def render(self, game, winners=(), question_id=None, points=None):
+        parts = list(self.parts)
+        for position in range(1, len(parts), 2):
+            parts[position] = game.get_message_parameter(parts[position], winners, question_id, points)
+        return "".join(parts)
+
+
+class Scheduler(object):
+    # Keeps a deadline for each named event in a heap, so that finding due events only means looking
+    #   at the earliest deadline. Scheduling an event again replaces its deadline. Replaced and cancelled
+    #   deadlines are left in the heap and skipped when they come up.
+    def __init__(self):
+        self.heap = []
+        self.deadlines = {}
+        self.sequence = 0  # Events with the same deadline come up in the order they were scheduled
+
+    def schedule(self, event, deadline):
+        self.deadlines[event] = deadline
+        self.sequence = self.sequence + 1
+        heapq.heappush(self.heap, (deadline, self.sequence, event))
+
+    def cancel(self, event):
+        self.deadlines.pop(event, None)
+
+    def is_scheduled(self, event):
+        return event in self.deadlines
+
+    def pop_due(self, now):
+        # Yields the events whose deadlines have passed, earliest first. An event scheduled while due events
+        #   are handled is left for the next call, even if its deadline has passed, so work that reschedules
+        #   itself straight away, such as paying winners a chunk at a time, runs once per Tick.
+        last_sequence = self.sequence
+        deferred = []
+        try:
+            while self.heap and self.heap[0][0] <= now:
+                entry = heapq.heappop(self.heap)
+                deadline, sequence, event = entry
+                if sequence > last_sequence:
+                    deferred.append(entry)
+                elif self.deadlines.get(event) == deadline:
+                    del self.deadlines[event]
+                    yield event
+        finally:
+            for entry in deferred:
+                heapq.heappush(self.heap, entry)
+
+
+class PerfCounter(object):
+    # Number of calls and time taken by one function. Times are counted into fixed buckets, so a counter
+    #   stays the same size however long the script runs.
+    __slots__ = ("count", "total", "maximum", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.buckets = [0] * len(perf_bucket_names)
+
+    def record(self, seconds):
+        self.count = self.count + 1
+        self.total = self.total + seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+        bucket = 0
+        while bucket < len(perf_bucket_limits) and seconds >= perf_bucket_limits[bucket]:
+            bucket = bucket + 1
+        self.buckets[bucket] = self.buckets[bucket] + 1
+
+    def toJSON(self):
+        return {"Count": self.count, "Total": round(self.total, 6), "Max": round(self.maximum, 6),
+                "Buckets": dict(zip(perf_bucket_names, self.buckets))}
 
 
 class LoggingLevel:
@@ -246,669 +744,96 @@ class LoggingLevel:
 # ---------------------------------------
 # Functions
 # ---------------------------------------
+def timed(name):
+    # Decorator that counts calls to a function and how long they take, for !trivia perf
+    def decorator(function):
+        counter = perf_counters.setdefault(name, PerfCounter())
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = perf_timer()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                counter.record(perf_timer() - start)
+        return wrapper
+    return decorator
+
+
 #   [Required] Initialize Data (Only called on load)
 def Init():
+    # The Chatbot runs a single game, the default game. Its settings also control logging and how questions
+    #   are saved.
+    global default_game
     global script_settings
-    global current_game
-    global question_expiry_time
-    script_settings = Settings(settings_file)
-    script_settings.Save(settings_file)
-    script_settings.cooldown_between_questions = max(script_settings.cooldown_between_questions, 0)
-    script_settings.duration_of_questions = max(script_settings.duration_of_questions, 0)
-    question_expiry_time = script_settings.duration_of_questions * 60
-
-    if script_settings.enable_game_detection:
-        if script_settings.twitch_channel_name == "":
-            log("Init: Game Detection has been enabled without being supplied a Twitch Username.",
-                LoggingLevel.str_to_int.get("Fatal"))
-            raise AttributeError("Game Detection has been enabled without being supplied a Twitch Username.")
-        # Log("Init: Game detection is enabled. Identifying most recent game.", LoggingLevel.str_to_int.get("Debug"))
-        current_game = json.loads(Parent.GetRequest(twitch_api_source + script_settings.twitch_channel_name, {})).get(
-            "response")
-        log("Init: Most recent game identified as " + str(current_game) + ".", LoggingLevel.str_to_int.get("Info"))
-    load_trivia()
+    default_game = TriviaGame(Parent, settings_file, current_question_file, rewards_ledger_file, perf_report_file)
+    script_settings = default_game.settings
+    trivia_games.append(default_game)
+    default_game.start()
     log("Init: Trivia Minigame Loaded", LoggingLevel.str_to_int.get("Info"))
     return
 
 
 # Function that runs every time the Trivia command is used
 def Execute(data):
-    global active
-    global current_question_index
-    user_id = get_user_id(data.RawData)
-
-    # Algorithm to start trivia if the trivia has been paused. Requires admin permission.
-    if not active:
-        if (Parent.HasPermission(data.User, script_settings.permissions_admins,
-                                 "") or user_id == "216768170") and data.Message == "!trivia start":
-            active = True
-            log("Trivia Start: Started with Command.", LoggingLevel.str_to_int.get("Info"))
-            post("Trivia started.")
-
-    # If (the streamer is live OR trivia can run when offline) and trivia is active...
-    if (Parent.IsLive() or not script_settings.run_only_when_live) and active and data.IsChatMessage():
-        # Check if the chatter has administrator permissions. If so, see if they are running an admin command.
-        if str(data.Message).startswith("!trivia") and (
-                Parent.HasPermission(data.User, script_settings.permissions_admins,
-                                     "") or user_id == "216768170") and data.GetParamCount() > 0:
-            subcommand = data.GetParam(1)
-            global current_game
-            global master_questions_list
-            global current_questions_list
-
-            if subcommand == "stop":
-                active = False
-                update_current_question_file("")
-                log("Trivia Stop: Stopped with Command.", LoggingLevel.str_to_int.get("Info"))
-                post("Trivia stopped.")
-            
-            elif subcommand == "save":
-                if save_trivia():
-                    post("Trivia saved.")
-
-            elif subcommand == "load":
-                if data.GetParamCount() == 2 and len(current_questions_list) > 0:
-                    next_question()
-                    # No confirmation necessary - if a question is loaded successfully the result will be obvious
-                elif data.GetParamCount() == 3:
-                    try:
-                        question_index = int(data.GetParam(2)) - 1
-                        if question_index < 0 or question_index > len(current_questions_list) - 1:
-                            raise IndexError("Question index out of bounds.")
-                        # Log("!Trivia Load: Called with supplied index.", LoggingLevel.str_to_int.get("Debug"))
-                        next_question(question_index)
-                    except (ValueError, IndexError) as e:
-                        log("Trivia Load: Question could not be loaded: " + str(e), LoggingLevel.str_to_int.get("Warn"))
-                        post("Error loading question. Was the supplied index a number and between 1 and " + str(
-                            len(current_questions_list)) + "?")
-                else:
-                    log("Trivia Load: Subcommand used, but no questions exist that can be loaded.",
-                        LoggingLevel.str_to_int.get("Info"))
-                    post("Cannot load questions - no questions exist.")
-
-            elif subcommand == "game":
-                if data.GetParamCount() == 2:
-                    if script_settings.enable_game_detection:
-                        post("The currently active game is " + str(current_game) + ".")
-                    else:
-                        post("Game detection is currently disabled.")
-                elif data.GetParam(2) == "detect":
-                    global game_detection_override
-                    get_twitch_game()
-                    post("Game detected as " + str(current_game) + ".")
-                    game_detection_override = False
-                elif data.GetParam(2) == "set":
-                    global game_detection_override
-                    if data.GetParamCount() >= 4:
-                        current_game = ' '.join(data.Message.split(" ")[3:])
-                        load_trivia()
-                        post("Active game set to " + str(current_game) + ".")
-                        game_detection_override = True
-                    else:
-                        post("Command usage: !trivia game set <game name>")
-                else:
-                    post("Command usage: !trivia game (detect)")
-
-            elif subcommand == "count":
-                # Return a count of the number of questions available
-                if script_settings.enable_game_detection:
-                    # Also include the number of questions currently matching the game
-                    post("Total questions: " + str(
-                        len(master_questions_list)) + ". Questions from " + current_game + ": " + str(
-                        len(current_questions_list)) + ".")
-                else:
-                    post("Number of questions available: " + str(len(master_questions_list)) + ".")
-
-            elif subcommand == "answers":
-                if current_question_index == -1:
-                    post("No questions are currently loaded.")
-                else:
-                    post("Answers to the current question: " + ", ".join(
-                        current_questions_list[current_question_index].get_answers()))
-
-            elif subcommand == "add":
-                if data.GetParamCount() == 2:
-                    post("Syntax: !trivia add (game:<Game Name>,) (points:<Points>,) "
-                         "question:<Question>, answers:<Pipe-Separated List of Answers>")
-                else:
-                    # Get all of the required attributes from the message
-                    # Try/catch to make sure points was convertible to an int
-                    try:
-                        new_points = int(get_attribute("points", data.Message))
-                    except ValueError:
-                        log("Trivia Add: No point value was supplied. Using the default point value.",
-                            LoggingLevel.str_to_int.get("Debug"))
-                        new_points = script_settings.default_loyalty_point_value
-
-                    try:
-                        new_game = get_attribute("game", data.Message)
-                    except ValueError:
-                        # If the attribute is not found, check for a current game, otherwise display an error
-                        if not current_game == "":
-                            new_game = current_game
-                        else:
-                            log("Trivia Add: Question not added. No game attribute detected in command call.",
-                                LoggingLevel.str_to_int.get("Warn"))
-                            post("Error: No game attribute detected. Please supply a game name.")
-                            return
-
-                    try:
-                        new_question_text = get_attribute("question", data.Message)
-                    except ValueError:
-                        # If the attribute is not found, display an error
-                        log("Trivia Add: Question not added. No question attribute detected in command call.",
-                            LoggingLevel.str_to_int.get("Warn"))
-                        post("Error: No question attribute detected.")
-                        return
-
-                    try:
-                        new_answers = get_attribute("answers", data.Message).split("|")
-                    except ValueError:
-                        # If the attribute is not found, display an error
-                        log("Trivia Add: Question not added. No answers attribute detected in command call.",
-                            LoggingLevel.str_to_int.get("Warn"))
-                        post("Error: No answers attribute detected. A question cannot be added without valid answers.")
-                        return
-
-                    # strip all whitespace from the beginning and ends of the answers
-                    i = 0
-                    while i < len(new_answers):
-                        new_answers[i] = new_answers[i].strip()
-                        i = i + 1
-
-                    # create the Question object and add it to the list of questions,
-                    #   then save the new list of questions
-                    new_question = Question(game=new_game, points=new_points, question=new_question_text,
-                                            answers=new_answers)
-                    master_questions_list.append(new_question)
-                    if not script_settings.enable_game_detection:
-                        current_questions_list.append(new_question)
-                    elif current_game == new_question.get_game():
-                        current_questions_list.append(new_question)
-                        question_index_map.append(len(master_questions_list) - 1)
-                    if save_trivia():
-                        log("Trivia Add: A new question has been added.", LoggingLevel.str_to_int.get("Info"))
-                        post("Question added.")
-
-            elif subcommand == "remove":
-                if data.GetParamCount() == 2:
-                    post("Syntax: !trivia remove <Question Index>")
-                else:
-                    try:
-                        question_index = int(data.GetParam(2)) - 1
-                        old_question = current_questions_list.pop(question_index)
-
-                        if script_settings.enable_game_detection:
-                            # Remove the question from the master question list using the index mapping
-                            master_questions_list.pop(question_index_map[question_index])
-
-                            # Pop the question out of the question_index_map, since it no longer exists
-                            # For each remaining entry in the question_index_map, we need to reduce
-                            #   indexes by one to reflect that a question was removed from the master list
-                            question_index_map.pop(question_index)
-                            question_index_map[question_index:] = [index - 1 for index in
-                                                                   question_index_map[question_index:]]
-                        else:
-                            master_questions_list.pop(question_index)
-                        if question_index == current_question_index:
-                            current_question_index = -1
-                        if save_trivia():
-                            log("Trivia Remove: A question has been removed: " + str(old_question),
-                                LoggingLevel.str_to_int.get("Info"))
-                            post("Question removed.")
-                    except (ValueError, IndexError) as e:
-                        log("Trivia Remove: Question could not be removed: " + str(e),
-                            LoggingLevel.str_to_int.get("Warn"))
-                        post("Error removing question. Was the supplied index a number and between 1 and " + str(
-                            len(current_questions_list)) + "?")
-
-            elif subcommand == "modify":
-                if data.GetParamCount() == 2:
-                    post("Syntax: !trivia modify <Question Index> (game:<New Value>,) (question:<New Value>,) "
-                         "(points:<New Value>,) (answers <add/remove/set>: <New Value>|<New Value>| ...)")
-                else:
-                    # Parameter two indicates the index of the question
-                    try:
-                        question_index = int(data.GetParam(2)) - 1
-                    except ValueError:
-                        # If parameter three was not an integer, display an error message
-                        log("Trivia Modify: Trivia Modify subcommand supplied a non-integer question index.",
-                            LoggingLevel.str_to_int.get("Warn"))
-                        post("Error: The supplied index was not a number.")
-                        return
-
-                    changes = False
-                    new_game = None
-                    new_question = None
-                    new_points = None
-                    new_answer_set = None
-                    new_answers = None
-                    old_answers = None
-                    if "game:" in data.Message:
-                        new_game = get_attribute("game", data.Message)
-                    if "question:" in data.Message:
-                        new_question = get_attribute("question", data.Message)
-                    if "points:" in data.Message:
-                        new_points = get_attribute("points", data.Message)
-                    if "answers set:" in data.Message:
-                        new_answer_set = get_attribute("answers set", data.Message).split(",")
-                    else:
-                        if "answers add:" in data.Message:
-                            new_answers = get_attribute("answers add", data.Message).split(",")
-                        if "answers remove:" in data.Message:
-                            old_answers = get_attribute("answers remove", data.Message).split(",")
-
-                    if new_game:
-                        current_questions_list[question_index].set_game(new_game)
-                        if script_settings.enable_game_detection:
-                            log("Trivia Modify: A question's game is being modified with Enable Game Detection Mode. "
-                                "Master Question List Index "
-                                + str(question_index_map[question_index]) +
-                                ". Current Question List Index " + str(question_index) + ".",
-                                LoggingLevel.str_to_int.get("Debug"))
-                            master_questions_list[question_index_map[question_index]].set_game(new_game)
-                        else:
-                            log("Trivia Modify: A question's game is being modified without Enable Game Detection Mode."
-                                " Master Question List Index "
-                                + str(question_index_map[question_index]) +
-                                ". Current Question List Index " + str(question_index) + ".",
-                                LoggingLevel.str_to_int.get("Debug"))
-                            master_questions_list[question_index].set_game(new_game)
-                        changes = True
-                    if new_question:
-                        current_questions_list[question_index].set_question(new_question)
-                        if script_settings.enable_game_detection:
-                            log("Trivia Modify: A question's question is being modified with Enable Game Detection "
-                                "Mode. Master Question List Index "
-                                + str(question_index_map[question_index]) +
-                                ". Current Question List Index " + str(question_index) + ".",
-                                LoggingLevel.str_to_int.get("Debug"))
-                            master_questions_list[question_index_map[question_index]].set_question(new_question)
-                        else:
-                            log("Trivia Modify: A question's question is being modified without Enable Game Detection"
-                                " Mode. Master Question List Index "
-                                + str(question_index_map[question_index]) +
-                                ". Current Question List Index " + str(question_index) + ".",
-                                LoggingLevel.str_to_int.get("Debug"))
-                            master_questions_list[question_index].set_question(new_question)
-                        changes = True
-                    if new_points:
-                        try:
-                            current_questions_list[question_index].set_points(int(new_points))
-                            if script_settings.enable_game_detection:
-                                log("Trivia Modify: A question's value is being modified with Enable Game Detection"
-                                    " Mode. Master Question List Index "
-                                    + str(question_index_map[question_index]) +
-                                    ". Current Question List Index " + str(question_index) + ".",
-                                    LoggingLevel.str_to_int.get("Debug"))
-                                master_questions_list[question_index_map[question_index]].set_points(int(new_points))
-                            else:
-                                log("Trivia Modify: A question's value is being modified without Enable Game Detection"
-                                    " Mode. Master Question List Index "
-                                    + str(question_index_map[question_index]) +
-                                    ". Current Question List Index " + str(question_index) + ".",
-                                    LoggingLevel.str_to_int.get("Debug"))
-                                master_questions_list[question_index].set_points(int(new_points))
-                            changes = True
-                        except ValueError as e:
-                            log("Trivia Modify: Trivia Modify subcommand supplied a non-integer point value.",
-                                LoggingLevel.str_to_int.get("Warn"))
-                            post(
-                                "Error: The supplied point value was not a number. "
-                                "The question's point value was not changed.")
-                    if new_answer_set:
-                        current_questions_list[question_index].set_answers(new_answer_set)
-                        if script_settings.enable_game_detection:
-                            log("Trivia Modify: A question's answer set is being modified with Enable Game Detection"
-                                " Mode. Master Question List Index "
-                                + str(question_index_map[question_index]) +
-                                ". Current Question List Index " + str(question_index) + ".",
-                                LoggingLevel.str_to_int.get("Debug"))
-                            master_questions_list[question_index_map[question_index]].set_answers(new_answer_set)
-                        else:
-                            log("Trivia Modify: A question's answer set is being modified with Enable Game Detection"
-                                " Mode. Master Question List Index "
-                                + str(question_index_map[question_index]) +
-                                ". Current Question List Index " + str(question_index) + ".",
-                                LoggingLevel.str_to_int.get("Debug"))
-                            master_questions_list[question_index].set_answers(new_answer_set)
-                        changes = True
-                    else:
-                        current_answers_current = current_questions_list[question_index].get_answers()
-                        if script_settings.enable_game_detection:
-                            current_answers_master = master_questions_list[
-                                question_index_map[question_index]].get_answers()
-                        else:
-                            current_answers_master = master_questions_list[question_index].get_answers()
-                        if new_answers:
-                            for answer in new_answers:
-                                if answer not in current_answers_current:
-                                    current_answers_current.append(answer)
-                                    current_answers_current.sort()
-                                    current_answers_master.append(answer)
-                                    current_answers_master.sort()
-                                    changes = True
-                        if old_answers:
-                            for answer in old_answers:
-                                if answer in current_answers_current:
-                                    current_answers_current.remove(answer)
-                                    current_answers_master.remove(answer)
-                                    changes = True
-
-                    if changes:
-                        if save_trivia():
-                            post("Question modified.")
-        elif str(data.Message).startswith("!trivia") and not (
-                Parent.HasPermission(data.User, script_settings.permissions_admins,
-                                     "") or user_id == "216768170") and data.GetParamCount() > 0:
-            log(data.UserName + " attempted to use trivia admin commands without permission. " + str(data.Message),
-                LoggingLevel.str_to_int.get("Info"))
-            post(data.UserName + ", you do not have the permissions to use this command.")
-        if Parent.HasPermission(data.User, script_settings.permissions_players, "") or user_id == "216768170":
-            if str(data.Message) == "!trivia":
-                global question_start_time
-                global question_expiry_time
-                if len(current_questions_list) == 0:
-                    log("!Trivia: Called to start new question, but no questions exist.",
-                        LoggingLevel.str_to_int.get("Warn"))
-                    if script_settings.enable_game_detection and len(master_questions_list) > 0:
-                        post("Could not load trivia. No questions exist for the current game.")
-                    else:
-                        post("Could not load trivia. No questions exist.")
-                elif current_question_index == -1:
-                    if (not script_settings.automatically_run_next_question) and ready_for_next_question:
-                        log("!Trivia: Called to start new question.", LoggingLevel.str_to_int.get("Debug"))
-                        global next_question_file_update_time
-                        global readiness_notification_time
-                        next_question()
-                        next_question_file_update_time = time.time()
-                        readiness_notification_time = time.time()
-                    else:
-                        log("!Trivia: There is no active trivia question.", LoggingLevel.str_to_int.get("Info"))
-                        if script_settings.display_next_question_time:
-                            post("There is no active trivia question. The next trivia question arrives in " + str(
-                                datetime.fromtimestamp(question_start_time - time.time()).strftime(
-                                    '%M minutes and %S seconds.')))
-                        else:
-                            post("There is no active trivia question.")
-                else:
-                    post(parse_string(script_settings.question_ask_string) + " Time remaining: " + str(
-                        datetime.fromtimestamp(question_expiry_time - time.time()).strftime(
-                            '%M minutes and %S seconds.')))
-            elif current_question_index != -1:
-                check_for_match(data)
+    default_game.execute(data)
 
 
 # Function that runs continuously
+@timed("Tick")
 def Tick():
-    global question_start_time
-    global question_expiry_time
-    global next_question_file_update_time
-    global active
-    if active and (not script_settings.run_only_when_live or (script_settings.run_only_when_live and Parent.IsLive())):
-        # If time has expired, check to see if there is a current question
-        # If there is a current question, depending on settings the answers
-        #   may need to be displayed and the points adjusted
-        current_time = time.time()
-        global current_question_index
-
-        if not current_question_index == -1:
-            # There is a current question
-            if current_time > question_expiry_time:
-                # The question has expired. End the question.
-                log("Tick: Question time exceeded. Ending question.", LoggingLevel.str_to_int.get("Debug"))
-                end_question()
-            elif script_settings.create_current_question_file and (current_time > next_question_file_update_time):
-                # The question has not expired. Display the question and the remaining time.
-                update_current_question_file(parse_string(script_settings.question_file_ask_string), 1)
-
-        else:
-            # There is no current question
-            if current_time > question_start_time:
-                # It is time for the next question.
-                if script_settings.automatically_run_next_question:
-                    # If the settings indicate to run the next question, do so.
-                    log("Tick: Starting next question.", LoggingLevel.str_to_int.get("Debug"))
-                    next_question()
-                else:
-                    # If the settings indicate to NOT run the next question,
-                    #   set the boolean and display that the next question is ready.
-                    global ready_for_next_question
-                    global readiness_notification_time
-                    ready_for_next_question = True
-                    if script_settings.create_current_question_file:
-                        update_current_question_file("The next question is ready! Type !trivia to begin.",
-                                                     time.time() + 86400)
-                    elif current_time > readiness_notification_time:
-                        if len(current_questions_list) > 0:
-                            post("The next question is ready! Type !trivia to begin.")
-                        readiness_notification_time = time.time() + (10 * 60)
-            elif script_settings.create_current_question_file and (current_time > next_question_file_update_time):
-                # It is not time for the next question. Display the remaining time until the next question.
-                update_current_question_file("Time until next question: " + str(
-                    datetime.fromtimestamp(question_start_time - time.time()).strftime('%M:%S')) + ".", 1)
-
-
-def check_for_match(data):
-    global current_question_index
-    try:
-        current_question = current_questions_list[current_question_index]
-        current_answers = current_question.get_answers()
-        for answer in current_answers:
-            if data.Message.lower().strip() == answer.lower().strip():
-                # We have a match. Add them to the dictionary of correct users,
-                #   then check to see if the question needs to be ended.
-                correct_users_dict[data.User] = data.UserName
-                log("CheckForMatch: Match detected between answer " + answer + " and message "
-                    + data.Message + ". User " + data.UserName + " added to the list of correct users.",
-                    LoggingLevel.str_to_int.get("Debug"))
-                log("CheckForMatch: There are currently " + str(len(correct_users_dict)) + " winners out of "
-                    "a maximum of " + str(script_settings.number_of_winners) + ". The grace period is " 
-                    "currently " + str(script_settings.enable_grace_period) + "."
-                    + data.Message + ". User " + data.UserName + " added to the list of correct users.",
-                    LoggingLevel.str_to_int.get("Debug"))
-                # Check to see if the maximum number of winners has been met
-                if 0 < script_settings.number_of_winners <= len(correct_users_dict):
-                    log("CheckForMatch: Number of winners achieved. Ending question.",
-                        LoggingLevel.str_to_int.get("Debug"))
-                    # If it has, immediately end the question
-                    end_question()
-                else:
-                    # If the maximum number of winners has not been met, but the grace period is being
-                    #   used, apply the grace period to end the question if it has not already been applied
-                    if script_settings.enable_grace_period:
-                        global grace_period_used
-                        if not grace_period_used:
-                            global question_expiry_time
-                            question_expiry_time = time.time() + script_settings.grace_period_duration_in_seconds
-                            grace_period_used = True
-    except IndexError:
-        current_question_index = -1
-
-
-def end_question():
-    global current_question_index
-    global question_start_time
-
-    # First, check to see if there is an active question. If there is no active question, nothing needs to be done.
-    if not current_question_index == -1:
-        # Check to see if there were any correct answers.
-        if len(correct_users_dict) > 0:
-            log("EndQuestion: Winners detected. Distributing points.", LoggingLevel.str_to_int.get("Debug"))
-            # Iterate through the correct users dictionary
-            correct_usernames = []
-            for user_ID in correct_users_dict.keys():
-                # If users are getting loyalty point rewards, reward the winners
-                if script_settings.enable_loyalty_point_rewards:
-                    # Determine if points are being divided amongst winners
-                    if script_settings.enable_points_dividing:
-                        Parent.AddPoints(user_ID,
-                                         correct_users_dict[user_ID],
-                                         ceil(current_question_points / len(correct_users_dict)))
-                        log("EndQuestion: Adding "
-                            + str(ceil(current_question_points / len(correct_users_dict)))
-                            + " " + Parent.GetCurrencyName() + " to user " + correct_users_dict[user_ID] + "."
-                            , LoggingLevel.str_to_int.get("Debug"))
-                    else:
-                        Parent.AddPoints(user_ID,
-                                         correct_users_dict[user_ID],
-                                         current_question_points)
-                        log("EndQuestion: Adding "
-                            + str(current_question_points)
-                            + " " + Parent.GetCurrencyName() + " to user " + correct_users_dict[user_ID] + "."
-                            , LoggingLevel.str_to_int.get("Debug"))
-                correct_usernames.append(correct_users_dict[user_ID])
-            correct_usernames.sort()    # Sort the list of winning usernames alphabetically
-
-            # Reduce the reward for that question, if desired
-            if script_settings.percent_loyalty_point_value_decrease_on_answered > 0:
-                # Get the question's current points.
-                question_points = current_questions_list[current_question_index].get_points()
-                # Determine the new points by multiplying the current points by a multiplier.
-                new_points = int(question_points - (question_points * (
-                        script_settings.percent_loyalty_point_value_decrease_on_answered / 100.0)))
-                # Assign the new value.
-                current_questions_list[current_question_index].set_points(new_points)
-                log("EndQuestion: Reducing points for question at index " + str(current_question_index + 1) + " by " +
-                    str(script_settings.percent_loyalty_point_value_decrease_on_answered) + " percent. (" + str(
-                    question_points) + " - " +
-                    str(int(question_points
-                            * (script_settings.percent_loyalty_point_value_decrease_on_answered
-                               / 100.0))) + " = " + str(new_points) + ")"
-                    , LoggingLevel.str_to_int.get("Debug"))
-                save_trivia()
-
-            # Post message rewarding users
-            if script_settings.create_current_question_file:
-                update_current_question_file(
-                    parse_string(string=script_settings.question_file_reward_string,
-                                 winners=correct_usernames), 10)
-            else:
-                if script_settings.cooldown_between_questions > 0:
-                    post(parse_string(string=script_settings.question_reward_string,
-                                      winners=correct_usernames))
-                else:
-                    post(parse_string(string=script_settings.question_reward_string, winners=correct_usernames))
-        else:
-            # No winners were detected. Display expiration message.
-            if script_settings.create_current_question_file:
-                update_current_question_file(parse_string(string=script_settings.question_expiration_string), 10)
-            else:
-                post(parse_string(string=script_settings.question_expiration_string))
-
-            # Increase the reward for that question, if desired.
-            if int(script_settings.percent_loyalty_point_value_increase_on_unanswered) > 0:
-                # Get the question's current points.
-                question_points = current_questions_list[current_question_index].get_points()
-                # Determine the new points by multiplying the current points by a multiplier.
-                new_points = int(question_points + question_points * (
-                        script_settings.percent_loyalty_point_value_increase_on_unanswered / 100.0))
-                # Assign the new value.
-                current_questions_list[current_question_index].set_points(new_points)
-                log("EndQuestion: Increasing points for question at index " + str(current_question_index + 1) + " by " +
-                    str(script_settings.percent_loyalty_point_value_increase_on_unanswered) + " percent. (" + str(
-                    question_points) + " + " +
-                    str(int(question_points
-                            * (script_settings.percent_loyalty_point_value_increase_on_unanswered
-                               / 100.0))) + " = " + str(new_points) + ")"
-                    , LoggingLevel.str_to_int.get("Debug"))
-                save_trivia()
-        correct_users_dict.clear()  # Clear the winners dictionary for use with the next question
-
-    # End current question and set the next question's start time.
-    current_question_index = -1
-    random_cooldown_multiplier = 1
-    if script_settings.randomize_question_cooldown:
-        if script_settings.question_cooldown_random_upper_bound > script_settings.question_cooldown_random_lower_bound:
-            random_cooldown_multiplier = \
-                float(Parent.GetRandom(script_settings.question_cooldown_random_lower_bound,
-                                       script_settings.question_cooldown_random_upper_bound)) / 100
-        elif script_settings.question_cooldown_random_lower_bound > script_settings.question_cooldown_random_upper_bound:
-            random_cooldown_multiplier = \
-                float(Parent.GetRandom(script_settings.question_cooldown_random_upper_bound,
-                                       script_settings.question_cooldown_random_lower_bound)) / 100
-        else:
-            random_cooldown_multiplier = script_settings.point_value_random_lower_bound
-    question_start_time = time.time() + (script_settings.cooldown_between_questions * 60 * random_cooldown_multiplier)
-
-    global ready_for_next_question
-    global grace_period_used
-    grace_period_used = False
-    ready_for_next_question = False
-
-
-def next_question(question_index=-1):
-    global current_questions_list
-
-    # Check to see if questions exist
-    if len(current_questions_list) > 0:
-        global current_question_index
-        global question_expiry_time
-        global ready_for_next_question
-        global current_game
-        global current_question_points
-        global game_detection_override
-
-        if script_settings.enable_game_detection and not game_detection_override:
-            get_twitch_game()
-
-        # Log the previous question to prevent duplicates
-        previous_question_index = current_question_index
-
-        # Start up a new question, avoiding using the same question twice in a row if possible
-        if question_index == -1:
-            if previous_question_index != -1 and len(current_questions_list) > 1:
-                while True:
-                    current_question_index = Parent.GetRandom(0, len(current_questions_list))
-                    if current_question_index != previous_question_index:
-                        break
-            else:
-                current_question_index = Parent.GetRandom(0, len(current_questions_list))
-        else:
-            current_question_index = question_index
-
-        # If random point scaling is in effect, determine the point reward here
-        if str(script_settings.reward_scaling).lower() == "random":
-            # Perform some conditionals to make sure that everything works no matter
-            #   which numbers are entered in which box
-            if script_settings.point_value_random_upper_bound > script_settings.point_value_random_lower_bound:
-                random_value_multiplier = float(Parent.GetRandom(script_settings.point_value_random_lower_bound,
-                                                                 script_settings.point_value_random_upper_bound)) / 100
-            elif script_settings.point_value_random_lower_bound > script_settings.point_value_random_upper_bound:
-                random_value_multiplier = float(Parent.GetRandom(script_settings.point_value_random_upper_bound,
-                                                                 script_settings.point_value_random_lower_bound)) / 100
-            else:
-                random_value_multiplier = script_settings.point_value_random_lower_bound
-            current_question_points = int(
-                ceil(current_questions_list[current_question_index].get_points() * random_value_multiplier))
-        else:
-            current_question_points = current_questions_list[current_question_index].get_points()
-
-        # If we are not logging to a file, post the question in chat. File display is handled by tick().
-        if not script_settings.create_current_question_file:
-            post(parse_string(string=script_settings.question_ask_string))
-
-        # Set the question expiration time
-        question_expiry_time = time.time() + (script_settings.duration_of_questions * 60)
-        log("NextQuestion: Next Question at " + datetime.fromtimestamp(question_expiry_time).strftime('%H:%M:%S') + ".",
-            LoggingLevel.str_to_int.get("Debug"))
-        ready_for_next_question = False
-    else:
-        # If questions do not exist, try again every 60 seconds
-        global question_start_time
-        log("NextQuestion: No questions exist. Trying again in 60 seconds.", LoggingLevel.str_to_int.get("Warn"))
-        question_start_time = time.time() + 60
+    for game in trivia_games:
+        game.tick()
+
+    # Write buffered log lines to the log file
+    if log_buffer and time.time() > next_log_flush_time:
+        flush_log()
+
+    # Write pending question changes to disk, at most once per save interval
+    if (pending_journal_records or question_deck_changed) and time.time() > next_trivia_flush_time:
+        flush_trivia()
+
+
+def add_trivia_game(parent, directory):
+    # Start another game sharing the default game's questions, such as for a second channel hosted by the
+    #   same program. Init must be called first. The game's settings, reward ledger, current question file
+    #   and perf report are kept in its own folder. Pass the channel's chat messages to the game's execute
+    #   method; Tick runs every game.
+    game = TriviaGame(parent, *[os.path.join(directory, os.path.basename(file_path))
+                                for file_path in (settings_file, current_question_file, rewards_ledger_file,
+                                                  perf_report_file)])
+    trivia_games.append(game)
+    game.start()
+    return game
+
+
+def get_perf_message(name=None):
+    # One counter's timing buckets, or the counters that have taken the most time in total
+    if name is not None:
+        counter = perf_counters.get(name)
+        if counter is None:
+            return "No timings for " + name + ". Timed functions: " + ", ".join(sorted(perf_counters)) + "."
+        return name + ": " + str(counter.count) + " calls. " + ", ".join(
+            bucket_name + ": " + str(bucket_count)
+            for bucket_name, bucket_count in zip(perf_bucket_names, counter.buckets)) + "."
+    entries = []
+    for name, counter in sorted(perf_counters.items(), key=lambda item: -item[1].total)[:6]:
+        if counter.count > 0:
+            entries.append(name + " " + str(counter.count) + " calls, avg "
+                           + str(round(counter.total / counter.count * 1000, 3)) + "ms, max "
+                           + str(round(counter.maximum * 1000, 3)) + "ms")
+    return "Timings: " + ("; ".join(entries) if entries else "nothing timed yet") + "."
 
 
 def get_attribute(attribute, message):
-    log("GetAttribute: Called with message \"" + message + "\" looking for attribute \"" + attribute + "\".",
-        LoggingLevel.str_to_int.get("Debug"))
+    log("GetAttribute: Called with message \"%s\" looking for attribute \"%s\".",
+        LoggingLevel.str_to_int.get("Debug"), message, attribute)
     attribute = attribute.lower() + ":"
     # The start index of the attribute begins at the end of the attribute designator, such as "game:"
     try:
         index_of_beginning_of_attribute = message.lower().index(attribute) + len(attribute)
-        log("GetAttribute: Attribute found at index " + str(index_of_beginning_of_attribute),
-            LoggingLevel.str_to_int.get("Debug"))
+        log("GetAttribute: Attribute found at index %s", LoggingLevel.str_to_int.get("Debug"),
+            index_of_beginning_of_attribute)
     except ValueError as e:
         log("GetAttribute: The attribute was not found in the message.", LoggingLevel.str_to_int.get("Debug"))
         if attribute.lower() == "points=":
@@ -928,214 +853,561 @@ def get_attribute(attribute, message):
     return result
 
 
-def parse_string(string, winners=[]):
-    # Apply question attributes to a string
-    global current_question_index
-    global current_question_points
+def normalize_answer(text):
+    # Answers and chat messages are compared case-insensitively and without surrounding whitespace
+    return text.lower().strip()
 
-    # Replace the $index parameter with the index of the current question
-    string = string.replace("$index", str(current_question_index + 1))
 
-    # Replace the $currency parameter with the name of the channel's currency
-    string = string.replace("$currency", str(Parent.GetCurrencyName()))
+def fold_answer(text):
+    # Reduce an answer to a tolerant form: no accents, punctuation, repeated spaces or leading article
+    if not isinstance(text, text_type):
+        try:
+            text = text.decode("utf-8")
+        except (AttributeError, UnicodeDecodeError):
+            pass
+    text = text.lower()
+    if unicodedata is not None and isinstance(text, text_type):
+        text = u"".join(character for character in unicodedata.normalize("NFKD", text)
+                        if not unicodedata.combining(character))
+    text = answer_folding_pattern.sub(" ", text).strip()
+    stripped = answer_article_pattern.sub("", text)
+    return stripped if stripped else text
+
+
+def within_edit_distance(first, second, limit):
+    # Levenshtein distance restricted to a band of width limit around the diagonal.
+    #   Stops as soon as every cell in a row exceeds the limit.
+    if abs(len(first) - len(second)) > limit:
+        return False
+    if first == second:
+        return True
+    too_far = limit + 1
+    previous_row = [column if column <= limit else too_far for column in range(len(second) + 1)]
+    for row in range(1, len(first) + 1):
+        current_row = [too_far] * (len(second) + 1)
+        if row <= limit:
+            current_row[0] = row
+        row_minimum = current_row[0]
+        for column in range(max(1, row - limit), min(len(second), row + limit) + 1):
+            cost = 0 if first[row - 1] == second[column - 1] else 1
+            value = min(previous_row[column] + 1, current_row[column - 1] + 1, previous_row[column - 1] + cost)
+            current_row[column] = value
+            if value < row_minimum:
+                row_minimum = value
+        if row_minimum > limit:
+            return False
+        previous_row = current_row
+    return previous_row[len(second)] <= limit
 
-    # Replace the $question parameter with the text of the current question
-    string = string.replace("$question", current_questions_list[current_question_index].get_question())
 
-    # Replace the $pointswon parameter with the points won by each person
-    if script_settings.enable_loyalty_point_rewards and len(correct_users_dict) > 0:
-        if script_settings.enable_points_dividing:
-            # If people loyalty point rewards are enabled and
-            string = string.replace("$pointswon", str(abs(current_question_points / len(correct_users_dict))))
-        else:
-            string = string.replace("$pointswon", str(current_question_points))
-    else:
-        # If nobody is winning points, replace with 0
-        string = string.replace("$pointswon", "0")
+@timed("save_trivia")
+def save_trivia():
+    # Write every question to the questions file and start a new, empty journal
+    global questions_file_checksum
+    global journal_record_count
+    try:
+        if not os.path.exists(questions_file):
+            log("SaveTrivia: The trivia file was not found. A new one was created.",
+                LoggingLevel.str_to_int.get("Warn"))
+
+        # Questions are written one per line so that each one can be found by its position in the file.
+        #   Questions that have not been read yet with lazy loading are copied from the current file.
+        source_data = None
+        if question_store.unread_questions:
+            with open(questions_file, 'rb') as infile:
+                source_data = infile.read()
+        separator = to_bytes(",\n")
+        lines = []
+        locations = []
+        game_numbers = {}
+        offset = len(to_bytes("[\n"))
+        for question_id in sorted(question_store):
+            line = question_store.get_raw(question_id, source_data)
+            game_number = game_numbers.setdefault(question_store.get_game(question_id), len(game_numbers))
+            locations.append([question_id, offset, len(line), game_number])
+            lines.append(line)
+            offset = offset + len(line) + len(separator)
+        data = to_bytes("[\n") + separator.join(lines) + to_bytes("\n]\n")
+        write_file_atomically(questions_file, data, script_settings.create_backup_files)
+        questions_file_checksum = get_checksum(data)
+        question_store.relocate(locations)
+
+        # The index lets lazy loading find every question without reading the questions file
+        games = [None] * len(game_numbers)
+        for game, game_number in game_numbers.items():
+            games[game_number] = game
+        write_file_atomically(questions_index_file, to_bytes(json.dumps(
+            {"Checksum": questions_file_checksum, "Size": len(data), "Modified": get_modified_time(questions_file),
+             "Games": games, "Questions": locations})))
+        log("SaveTrivia: The trivia file was successfully updated.", LoggingLevel.str_to_int.get("Debug"))
+
+        # Every change in the journal, and every change waiting to be journaled, is now part of the questions file
+        if os.path.exists(questions_journal_file):
+            os.remove(questions_journal_file)
+        journal_record_count = 0
+        del pending_journal_records[:]
+        save_question_deck()
+        return True
+
+    except (IOError, OSError) as e:
+        log("SaveTrivia: Unable to save trivia questions: " + str(e), LoggingLevel.str_to_int.get("Fatal"))
+        raise e
 
-    # Replace the $points parameter with the points of the current question
-    string = string.replace("$points", str(current_question_points))
 
-    # Replace the $answers parameter with a list of correct answers for the current question
-    string = string.replace("$answers", ", ".join(current_questions_list[current_question_index].get_answers()))
+def journal_trivia(record):
+    # Record a single question change. Changes are held in memory and written to the journal by flush_trivia,
+    #   which Tick calls at most once per save interval, so bursts of changes cost a single write.
+    # The record is serialized now, since the question it describes may change again before the flush
+    pending_journal_records.append(json.dumps(record))
+    # Every game shares the questions, so every game is told about the change
+    question_id = record["ID"] if "ID" in record else record["Question"]["ID"]
+    for game in trivia_games:
+        game.question_changed(question_id)
+    return True
+
+
+@timed("flush_trivia")
+def flush_trivia():
+    # Append any pending question changes to the journal, or fold everything into the questions file
+    #   if the journal has grown large enough.
+    global journal_record_count
+    global next_trivia_flush_time
+    next_trivia_flush_time = time.time() + script_settings.save_interval_in_seconds
+    if question_deck_changed:
+        save_question_deck()
+    if not pending_journal_records:
+        return True
+    try:
+        if questions_file_checksum is None or \
+                journal_record_count + len(pending_journal_records) > journal_compaction_threshold:
+            return save_trivia()
+        lines = []
+        if journal_record_count == 0:
+            # The first record names the questions file the journal applies to, so that a journal
+            #   left behind by an interrupted save_trivia is never applied twice
+            lines.append(json.dumps({"Action": "begin", "Checksum": questions_file_checksum}))
+        lines.extend(pending_journal_records)
+        with open(questions_journal_file, 'ab' if journal_record_count > 0 else 'wb') as journal:
+            journal.write(to_bytes("\n".join(lines) + "\n"))
+            journal.flush()
+            os.fsync(journal.fileno())
+        journal_record_count = journal_record_count + len(lines)
+        del pending_journal_records[:]
+        return True
+    except (IOError, OSError) as e:
+        # Keep the changes pending so the next flush tries again
+        log("FlushTrivia: Unable to record question changes: " + str(e), LoggingLevel.str_to_int.get("Fatal"))
+        return False
 
-    # Replace the $game parameter with the game of the current question
-    string = string.replace("$game", current_questions_list[current_question_index].get_game())
 
-    # Replace the $winnerspossible parameter with the number of possible winners
-    string = string.replace("$winnerspossible", str(script_settings.number_of_winners))
+def replay_trivia_journal():
+    # Apply the changes recorded in the journal to the question store
+    if not os.path.exists(questions_journal_file):
+        return
+    with open(questions_journal_file, 'rb') as journal:
+        lines = journal.read().decode("utf-8").splitlines()
+    applied = 0
+    for line_number, line in enumerate(lines):
+        try:
+            record = json.loads(line)
+            action = record["Action"]
+            if action == "begin":
+                if record["Checksum"] != questions_file_checksum:
+                    log("LoadTrivia: The question journal does not belong to the current questions file. "
+                        "Ignoring it.", LoggingLevel.str_to_int.get("Warn"))
+                    break
+            elif action == "add":
+                add_question(question_from_json(record["Question"]))
+            elif action == "remove":
+                remove_question(record["ID"])
+            elif action == "modify":
+                new_question = question_from_json(record["Question"])
+                remove_question(new_question.get_id())
+                add_question(new_question)
+            elif action == "points":
+                question_store[record["ID"]].set_points(record["Points"])
+            applied = applied + 1
+        except (ValueError, KeyError) as e:
+            # A partially written final line is expected if the Chatbot closed during a write
+            log("LoadTrivia: Skipping unreadable journal entry on line " + str(line_number + 1) + ": " + str(e),
+                LoggingLevel.str_to_int.get("Warn"))
+    log("LoadTrivia: Replayed " + str(applied) + " journal entries.", LoggingLevel.str_to_int.get("Debug"))
 
-    # Replace the $winnercount parameter with the number of actual winners
-    string = string.replace("$winnercount", str(len(correct_users_dict)))
+    # Fold the replayed changes into the questions file so the next journal starts clean
+    save_trivia()
 
-    # Replace the $winnerlist parameter with a list of users that answered the current question correctly
-    if len(winners) > 2:
-        string = string.replace("$winnerlist", ', '.join(winners[:-1]) + ", and " + str(winners[-1]))
-    elif len(winners) == 2:
-        string = string.replace("$winnerlist", ' and '.join(winners))
-    elif winners:
-        string = string.replace("$winnerlist", winners[0])
 
-    # Replace the $timeremaining parameter with hte remaining time of the current question
-    global question_expiry_time
-    string = string.replace("$timeremaining",
-                            str(datetime.fromtimestamp(question_expiry_time - time.time()).strftime(
-                                '%M minutes and %S seconds')))
+def question_from_json(question):
+    return Question(id=question.get("ID"),
+                    game=question["Game"],
+                    points=question["Points"],
+                    question=question["Question"],
+                    answers=question["Answers"])
 
-    # Replace the $time parameter with the time between questions
-    string = string.replace("$time", str(datetime.fromtimestamp(question_start_time
-                                                                - time.time()).strftime('%M minutes and %S seconds.')))
-    return string
 
+def import_questions(file_path, default_game="", default_points=None):
+    # Import every question in a file at once. Chat commands use QuestionImport a chunk at a time instead.
+    question_import = QuestionImport(file_path, default_game, default_points)
+    question_import.process(float("inf"))
+    return question_import
 
-def save_trivia():
+
+def read_question_file(file_path):
+    # Yields each question in a CSV, JSON lines or JSON array file: a dictionary for a CSV row or JSON array
+    #   entry, or the text of a JSON line. CSV and JSON lines files are read one line at a time. Records are
+    #   checked by question_from_import, so an invalid record only skips that question.
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".csv":
+        # The first row names the columns: Game, Question, Answers (pipe-separated) and optionally Points
+        if str is bytes:
+            infile = open(file_path, 'rb')
+            decode = lambda value: value.decode("utf-8")
+        else:
+            infile = io.open(file_path, encoding="utf-8", newline="")
+            decode = lambda value: value
+        with infile:
+            reader = csv.reader(infile)
+            header = [decode(column).lstrip(u"\ufeff").strip().lower() for column in next(reader)]
+            for row in reader:
+                if row:
+                    yield dict(zip(header, [decode(value) for value in row]))
+    elif extension in (".jsonl", ".jsonlines"):
+        with io.open(file_path, encoding="utf-8-sig") as infile:
+            for line in infile:
+                if line.strip():
+                    yield line
+    elif extension == ".json":
+        with io.open(file_path, encoding="utf-8-sig") as infile:
+            object_data = json.load(infile)
+        for question in object_data:
+            yield question
+    else:
+        raise ValueError("Unsupported file type " + extension + ". Use .csv, .jsonl or .json.")
+
+
+def question_from_import(record, default_game, default_points):
+    # Builds a question from an imported record, using the same defaults as !trivia add
+    if not isinstance(record, dict):
+        record = json.loads(record)
+    record = dict((key.lower(), value) for key, value in record.items())
+    game = record.get("game") or default_game
+    question_text = record["question"].strip()
+    answers = record["answers"]
+    if not isinstance(answers, list):
+        answers = answers.split("|")
+    answers = [answer.strip() for answer in answers if answer.strip()]
+    if not game or not question_text or not answers:
+        raise ValueError("A game, question and at least one answer are required.")
+    points = int(record["points"]) if record.get("points") not in (None, "") else default_points
+    return Question(game=game.strip(), points=points, question=question_text, answers=answers)
+
+
+def get_question_fingerprint(game, question_text):
+    return normalize_answer(game), normalize_answer(question_text)
+
+
+def get_question_fingerprints():
+    # The fingerprint of every existing question. Questions not read yet by lazy loading are read
+    #   straight from the questions file without creating Question objects.
+    fingerprints = set(get_question_fingerprint(question.get_game(), question.get_question())
+                       for question in question_store.questions.values())
+    if question_store.unread_questions:
+        with open(questions_file, 'rb') as infile:
+            source_data = infile.read()
+        for question_id in question_store.unread_questions:
+            question = json.loads(question_store.get_raw(question_id, source_data).decode("utf-8"))
+            fingerprints.add(get_question_fingerprint(question["Game"], question["Question"]))
+    return fingerprints
+
+
+def add_question(question):
+    # Add a question to the question store and the pools it belongs to. Questions without an ID,
+    #   or with an ID that is already taken, are given the next available ID.
+    global next_question_id
+    if question.get_id() is None or question.get_id() in question_store:
+        question.id = next_question_id
+    next_question_id = max(next_question_id, question.get_id() + 1)
+    question_store[question.get_id()] = question
+    all_questions.add(question.get_id())
+    get_game_pool(question.get_game()).add(question.get_id())
+
+
+def remove_question(question_id):
+    # Remove a question from the question store and every pool. Raises KeyError if the ID does not exist.
+    game = question_store.get_game(question_id)
+    question = question_store.pop(question_id)
+    all_questions.discard(question_id)
+    get_game_pool(game).discard(question_id)
+    return question
+
+
+def set_question_game(question, new_game):
+    # Change a question's game, moving it to the new game's pool
+    get_game_pool(question.get_game()).discard(question.get_id())
+    question.set_game(new_game)
+    get_game_pool(new_game).add(question.get_id())
+
+
+def intern_game_name(game):
+    # Questions from the same game share a single copy of the game's name
+    return game_names.setdefault(game, game)
+
+
+def add_unread_question(question_id, offset, length, game):
+    # Add a question that lazy loading has located in the questions file, but not read yet
+    global next_question_id
+    game = intern_game_name(game)
+    next_question_id = max(next_question_id, question_id + 1)
+    question_store.add_unread(question_id, offset, length, game)
+    all_questions.add(question_id)
+    get_game_pool(game).add(question_id)
+
+
+def load_trivia_index(data_size, modified_time):
+    # Locate every question using the index written by save_trivia. Returns False if there is no index
+    #   or it does not describe the current questions file. The file is not read to check its checksum, so a
+    #   file edited since it was saved is recognized by its size and modified time.
+    global questions_file_checksum
+    if not os.path.exists(questions_index_file):
+        return False
     try:
-        # if the trivia file does not exist, create it
-        if not os.path.exists(questions_file):
-            with io.open(questions_file, 'w') as outfile:
-                outfile.write(json.dumps({}))
-            log("SaveTrivia: The trivia file was not found. A new one was created.",
+        with open(questions_index_file, 'rb') as infile:
+            index = json.loads(infile.read().decode("utf-8"))
+        if index["Size"] != data_size or index.get("Modified") != modified_time:
+            log("LoadTrivia: The question index is out of date. Reading every question.",
                 LoggingLevel.str_to_int.get("Warn"))
+            return False
+        games = index["Games"]
+        for question_id, offset, length, game_number in index["Questions"]:
+            add_unread_question(question_id, offset, length, games[game_number])
+        questions_file_checksum = index["Checksum"]
+        return True
+    except (ValueError, KeyError, TypeError, IndexError) as e:
+        log("LoadTrivia: The question index could not be read: " + str(e), LoggingLevel.str_to_int.get("Warn"))
+        return False
 
-        # record the questions
-        with open(questions_file, 'w') as outfile:
-            outfile.seek(0)
-            # When writing the Questions to disk, use the Question.toJSON() function
-            json.dump(master_questions_list, outfile, indent=4, default=lambda q: q.toJSON())
-            outfile.truncate()
-            log("SaveTrivia: The trivia file was successfully updated.", LoggingLevel.str_to_int.get("Debug"))
 
-        return True
+def mark_question_asked(question_id):
+    # Mark a question as drawn in every pool it is in, so switching between games or to every question
+    #   does not ask it again before the rest of that pool
+    global question_deck_changed
+    all_questions.mark_drawn(question_id)
+    get_game_pool(question_store.get_game(question_id)).mark_drawn(question_id)
+    question_deck_changed = True
 
-    except IOError as e:
-        log("SaveTrivia: Unable to save trivia questions: " + str(e), LoggingLevel.str_to_int.get("Fatal"))
-        raise e
 
+def save_question_deck():
+    # Record which questions each pool has asked this round, so a restart carries on with the same rounds
+    global question_deck_changed
+    deck = {"All": all_questions.get_drawn_ids(),
+            "Games": dict((game, pool.get_drawn_ids()) for game, pool in game_pools.items() if pool.get_drawn_ids())}
+    try:
+        write_file_atomically(question_deck_file, to_bytes(json.dumps(deck)), sync=False)
+        question_deck_changed = False
+    except (IOError, OSError) as e:
+        log("SaveQuestionDeck: Unable to record asked questions: " + str(e), LoggingLevel.str_to_int.get("Warn"))
 
-def load_trivia():
-    # Check if the length of the master questions list is 0. If it is, we need to load questions.
-    global master_questions_list
-    global current_questions_list
-    global current_question_index
 
-    # If there is a question currently running, end that question.
-    if current_question_index != -1:
-        end_question()
+def load_question_deck():
+    # Mark the questions recorded by save_question_deck as drawn. Questions that no longer exist are ignored.
+    if not os.path.exists(question_deck_file):
+        return
+    try:
+        with open(question_deck_file, 'rb') as infile:
+            deck = json.loads(infile.read().decode("utf-8"))
+        for question_id in deck["All"]:
+            all_questions.mark_drawn(question_id)
+        for game, question_ids in deck["Games"].items():
+            if game in game_pools:
+                for question_id in question_ids:
+                    game_pools[game].mark_drawn(question_id)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        log("LoadTrivia: The question deck could not be read. Starting a new round of questions: " + str(e),
+            LoggingLevel.str_to_int.get("Warn"))
+
+
+def get_game_pool(game):
+    if game not in game_pools:
+        game_pools[game] = QuestionPool()
+    return game_pools[game]
+
+
+def write_file_atomically(file_path, data, keep_backup=False, sync=True):
+    # Write to a temporary file, flush it to disk, then swap it into place. A crash at any point leaves
+    #   either the old file or the new file, never a truncated one. The previous version can be kept as .bak.
+    #   Files that are cheap to lose, such as the current question file, can skip flushing to disk.
+    temporary_file = file_path + ".tmp"
+    with open(temporary_file, 'wb') as outfile:
+        outfile.write(data)
+        if sync:
+            outfile.flush()
+            os.fsync(outfile.fileno())
+    replace_file(temporary_file, file_path, file_path + ".bak" if keep_backup else None)
+
+
+def replace_file(source, destination, backup_file=None):
+    # Swap source into place in a single step, so destination is never missing, even after a crash.
+    #   If a backup file is given, the previous destination is copied there first.
+    if DotNetFile is not None and os.path.exists(destination):
+        try:
+            DotNetFile.Replace(source, destination, backup_file)
+        except Exception as e:
+            # .NET exceptions are reported like the OSError os.replace would raise
+            raise OSError(str(e))
+        return
+    if backup_file is not None and os.path.exists(destination):
+        shutil.copyfile(destination, backup_file)
+    if hasattr(os, "replace"):
+        os.replace(source, destination)
+        return
+    try:
+        os.rename(source, destination)
+    except OSError:
+        # Windows will not rename over an existing file. A crash between removing and renaming leaves only
+        #   the temporary file, which load_questions recovers from.
+        if not os.path.exists(destination):
+            raise
+        os.remove(destination)
+        os.rename(source, destination)
 
-    if len(master_questions_list) == 0:
-        # If the question list is empty, we need to load trivia from file. First, check if the file exists.
-        if os.path.exists(questions_file):
-            try:
-                with io.open(questions_file) as infile:
-                    object_data = json.load(infile)  # Load the json data
-
-                # For each object/question in the object_data, create new questions
-                #   and feed them to the master_questions_list
-                # If game detection is off, feed them to the g
-                global master_questions_list
-                global current_questions_list
-                global current_game
-                for question in object_data:
-                    new_question = Question(game=question["Game"],
-                                            points=question["Points"],
-                                            question=question["Question"],
-                                            answers=question["Answers"])
-                    master_questions_list.append(new_question)
-            except ValueError:
-                log("LoadTrivia: Question file exists, but contained no data.", LoggingLevel.str_to_int.get("Warn"))
-        else:
-            log("LoadTrivia: No questions file exists.", LoggingLevel.str_to_int.get("Warn"))
-
-    # Check if the length of the master questions list is greater than 0.
-    if len(master_questions_list) > 0:
-        del current_questions_list[:]
-        del question_index_map[:]
-        # If the length of the master questions list is greater than 0, we can check if the user is using game detection
-        if not script_settings.enable_game_detection:
-            # User is not using game detection. Copy the master list to the current questions list
-            current_questions_list = master_questions_list[:]
-        elif script_settings.enable_game_detection:
-            # User is using game detection. Iterate over the master list to get games matching their current game.
-            for i in range(len(master_questions_list)):
-                if master_questions_list[i].get_game() == current_game:
-                    current_questions_list.append(master_questions_list[i])
-                    question_index_map.append(i)
-    log("LoadTrivia: Questions loaded into master list: " + str(
-        len(master_questions_list)) + ". Questions currently being used: " + str(len(current_questions_list)),
-        LoggingLevel.str_to_int.get("Info"))
+
+def get_modified_time(file_path):
+    # Rounded so the time read back from the question index compares equal
+    return round(os.path.getmtime(file_path), 3)
+
+
+def get_checksum(data):
+    return zlib.crc32(data) & 0xffffffff
+
+
+def to_bytes(text):
+    return text if isinstance(text, bytes) else text.encode("utf-8")
+
+
+def load_questions():
+    # Load every question from file, once, for every game to share. If the questions file is missing or
+    #   unreadable, fall back to the temporary file of a save that was interrupted, then to the backup made
+    #   by the previous save.
+    global all_questions
+    global question_store
+    global questions_file_checksum
+
+    all_questions = QuestionPool()
+    question_store = QuestionStore(questions_file)
+
+    # With lazy loading, only the index is read. Questions are read from the questions file when used.
+    loaded = script_settings.enable_lazy_loading and os.path.exists(questions_file) \
+        and load_trivia_index(os.path.getsize(questions_file), get_modified_time(questions_file))
+    if loaded:
+        # The deck is loaded before the journal is replayed, since replaying saves the questions and the deck
+        load_question_deck()
+        replay_trivia_journal()
+        log("LoadQuestions: Located " + str(len(question_store)) + " questions using the question index.",
+            LoggingLevel.str_to_int.get("Debug"))
+
+    for file_path in (questions_file, questions_file + ".tmp", questions_file + ".bak"):
+        if loaded:
+            break
+        if not os.path.exists(file_path):
+            continue
+        try:
+            with open(file_path, 'rb') as infile:
+                data = infile.read()
+            object_data = json.loads(data.decode("utf-8-sig"))  # Load the json data
+            loaded_questions = [question_from_json(question) for question in object_data]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            log("LoadQuestions: Question file " + file_path + " exists, but could not be read.",
+                LoggingLevel.str_to_int.get("Warn"))
+            continue
+
+        # Questions saved before IDs existed are numbered in file order, after any questions that have IDs
+        global next_question_id
+        next_question_id = max([question.get_id() for question in loaded_questions
+                                if question.get_id() is not None] or [0]) + 1
+        for question in loaded_questions:
+            add_question(question)
+        questions_file_checksum = get_checksum(data)
+        load_question_deck()
+
+        # Apply any changes made since the questions file was last written
+        replay_trivia_journal()
+        if file_path == questions_file + ".tmp":
+            # Put questions recovered from an interrupted save back in the questions file
+            save_trivia()
+        loaded = True
+
+    if not loaded:
+        log("LoadQuestions: No readable questions file exists.", LoggingLevel.str_to_int.get("Warn"))
 
 
 # Reload Settings (Called when a user clicks the Save Settings button in the Chatbot UI)
 def ReloadSettings(jsonData):
-    # Execute json reloading here
-    log("ReloadSettings: Saving settings from Chatbot UI...", LoggingLevel.str_to_int.get("Info"))
-    global script_settings
-    global current_question_index
-    previous_game_detection = script_settings.enable_game_detection
-    previous_duration_of_questions = script_settings.duration_of_questions
-    previous_cooldown_between_questions = script_settings.cooldown_between_questions
-    script_settings.__dict__ = json.loads(jsonData)
-    script_settings.Save(settings_file)
-
-    # If the user disabled the usage of the script file, empty the file so the on screen display goes away
-    if not script_settings.create_current_question_file:
-        update_current_question_file("")
-
-    # If the duration of a question changed and there was a question active, we need to adjust the time accordingly
-    if not current_question_index == -1 and not previous_duration_of_questions == script_settings.duration_of_questions:
-        global question_expiry_time
-        question_expiry_time = question_expiry_time + (
-                script_settings.duration_of_questions - previous_duration_of_questions) * 60
-
-    # If the duration between questions changed and there is no question active, we need to adjust the time accordingly
-    if current_question_index == -1 and \
-            not previous_cooldown_between_questions == script_settings.cooldown_between_questions:
-        global question_start_time
-        question_start_time = question_start_time + (
-                script_settings.cooldown_between_questions - previous_cooldown_between_questions) * 60
-
-    # If the user has toggled game detection, reload the current question list and update current game
-    if not previous_game_detection == script_settings.enable_game_detection:
-        global current_game
-        if not script_settings.enable_game_detection:
-            current_game = ""
-            log("ReloadSettings: Game Detection deactivated. Reloading questions.", LoggingLevel.str_to_int.get("Info"))
-        else:
-            current_game = json.loads(
-                Parent.GetRequest(twitch_api_source + script_settings.twitch_channel_name, {})).get("response")
-            log("ReloadSettings: Game Detection activated. Most recent game identified as " + str(
-                current_game) + ". Reloading questions.", LoggingLevel.str_to_int.get("Info"))
+    default_game.reload_settings(jsonData)
 
-        load_trivia()
 
-    log("ReloadSettings: Settings saved and applied successfully", LoggingLevel.str_to_int.get("Info"))
+# Unload (Called when the script is reloaded or the Chatbot closes)
+def Unload():
+    # Question changes and log lines are held in memory between saves, so write them before the script goes away
+    flush_trivia()
+    flush_log()
 
 
-def log(message, level=LoggingLevel.str_to_int.get("All")):
+def log(message, level=LoggingLevel.str_to_int.get("All"), *args):
+    # Any args are formatted into the message with %, and only if the message will be logged somewhere,
+    #   so frequent debug messages cost little when debug logging is off.
+    to_chatbot = LoggingLevel.str_to_int.get(script_settings.debug_level) <= level
+    if not to_chatbot and not script_settings.enable_file_logging:
+        return
+    if args:
+        message = message % args
     if script_settings.enable_file_logging:
-        global log_file
-        file = open(log_file, "a+")
-        file.writelines(str(datetime.now()).ljust(26) + " " + str(LoggingLevel.int_to_string.get(level) + ":").ljust(
-            10) + message + "\n")
-        file.close()
-    if LoggingLevel.str_to_int.get(script_settings.debug_level) <= level:
+        # Lines are buffered and written by Tick, rather than opening the log file for every message
+        line = str(datetime.now()).ljust(26) + " " + str(LoggingLevel.int_to_string.get(level) + ":").ljust(
+            10) + message + "\n"
+        with log_buffer_lock:
+            log_buffer.append(line)
+            buffer_full = len(log_buffer) >= log_buffer_limit
+        if buffer_full or level >= LoggingLevel.str_to_int.get("Fatal"):
+            flush_log()
+    if to_chatbot:
         Parent.Log(ScriptName, "(" + str(LoggingLevel.int_to_string.get(level)) + ") " + message)
 
 
-def post(message):
-    Parent.SendStreamMessage(message)
+def flush_log():
+    # Append buffered log lines to the log file, rotating the file once it grows past the maximum size
+    global next_log_flush_time
+    next_log_flush_time = time.time() + log_flush_interval_in_seconds
+    with log_buffer_lock:
+        if not log_buffer:
+            return
+        data = to_bytes("".join(log_buffer))
+        del log_buffer[:]
+    try:
+        if os.path.exists(log_file) and \
+                os.path.getsize(log_file) + len(data) > script_settings.log_file_max_size_in_kb * 1024:
+            rotate_log()
+        with open(log_file, "ab") as file:
+            file.write(data)
+    except (IOError, OSError) as e:
+        # Logging the failure to the log file would only fail again
+        Parent.Log(ScriptName, "(Warn) FlushLog: Unable to write to the log file: " + str(e))
+
+
+def rotate_log():
+    # trivialog.txt becomes trivialog.txt.1, trivialog.txt.1 becomes trivialog.txt.2, and so on.
+    #   The oldest log file is removed.
+    for number in range(log_file_backup_count, 0, -1):
+        source = log_file + ("." + str(number - 1) if number > 1 else "")
+        if os.path.exists(source):
+            replace_file(source, log_file + "." + str(number))
+    if os.path.exists(log_file):
+        os.remove(log_file)
 
 
-def update_current_question_file(line=None, duration_in_seconds=1):
-    global current_question_file
-    global next_question_file_update_time
-    file = open(current_question_file, "w+")
-    file.seek(0)
-    if line:
-        file.write(line)
-    file.truncate()
-    file.close()
-    next_question_file_update_time = time.time() + duration_in_seconds
+def is_script_creator(data):
+    # The script's creator can use trivia commands in any channel. Only checked once permissions fail,
+    #   so the message's tags are rarely read.
+    return get_user_id(data.RawData) == "216768170"
 
 
 def get_user_id(raw_data):
@@ -1148,16 +1420,1203 @@ def get_user_id(raw_data):
     return raw_data
 
 
-def get_twitch_game():
-    global current_game
-    if script_settings.twitch_channel_name == "":
-        log("NextQuestion: Game Detection has been enabled without being supplied a Twitch Username.", LoggingLevel.str_to_int.get("Fatal"))
-        raise AttributeError("Game Detection has been enabled without being supplied a Twitch Username.")
-    previous_game = current_game
-    current_game = json.loads(Parent.GetRequest(twitch_api_source + script_settings.twitch_channel_name, {})).get("response")
+@timed("fetch_twitch_game")
+def fetch_twitch_game(parent, channel):
+    # Looks up the game being played on a Twitch channel. Runs on the game detector's background thread.
+    response = json.loads(parent.GetRequest(twitch_api_source + channel, {}))
+    if response.get("status") != 200 or not response.get("response"):
+        raise IOError("Status " + str(response.get("status")) + ": " + str(response.get("error") or response.get("response")))
+    return response.get("response")
+
+
+# ---------------------------------------
+# Trivia Game
+# ---------------------------------------
+class TriviaGame(object):
+    # One game of trivia in one channel: its settings, the question being asked, its winners, payouts and
+    #   stats. Every game shares the questions, which are loaded once. The Chatbot runs a single game through
+    #   Init, Execute and Tick. A program hosting several channels adds a game for each with add_trivia_game.
+    def __init__(self, parent, settings_file, current_question_file, rewards_ledger_file, perf_report_file):
+        self.parent = parent  # The Chatbot, or whatever stands in for it, for this game's channel
+        self.settings_file = settings_file
+        self.current_question_file = current_question_file
+        self.rewards_ledger_file = rewards_ledger_file
+        self.perf_report_file = perf_report_file
+        self.settings = Settings(settings_file)
+
+        self.current_pool = None  # Pool of question IDs currently being used, depending on settings
+        self.current_question_id = -1  # ID of the current question
+        self.current_question_points = 0  # Current question points, used when random scaling is in effect
+        self.answer_matcher = None  # Normalized answers of the current question, built when it is asked
+        self.current_game = ""  # Current game, as returned by an API call
+        self.game_detection_override = False  # Keeps a game set with !trivia game set from being replaced
+        self.game_detector = GameDetector(self.settings, parent)  # Looks up the current game in the background
+        self.announce_detected_game = False  # Post the game found by the lookup !trivia game detect started
+        self.scheduler = Scheduler()  # Deadlines for question events, checked by tick
+        self.question_start_time = clock()  # What time does the next question start?
+        self.ready_for_next_question = True  # Boolean used when questions do not automatically start.
+        self.question_expiry_time = 0  # How many minutes questions last
+        self.current_question_file_text = None  # Text last written to the current question file, None if unknown
+        # (pool, question ID, points, ask message or None, answer matcher) of the next question, set during
+        #   the cooldown
+        self.prepared_question = None
+        self.grace_period_used = False  # Tracks if the grace period has started for this question
+
+        self.correct_users_dict = {}  # Dictionary of users that gave correct answers, used in multi-reward mode
+        self.pending_payouts = {}  # Rewards not yet paid, as (award ID, user ID): [username, points, failed attempts]
+        self.next_award_id = 1  # ID given to the next award recorded in the reward ledger
+        self.question_asked_time = 0  # When the current question was asked, used to time answers
+        self.answer_times = {}  # User ID: seconds taken to answer the current question correctly
+
+        self.user_stats = {}  # User ID: UserStats for every user who has won, built from the reward ledger
+        self.user_ids_by_name = {}  # Lowercase username: user ID, for looking up stats by name
+        self.leaderboard = []  # Rank keys of every user who has won, kept sorted so the best players come first
+        self.streak_holders = set()  # IDs of users with a current streak, which ends when they miss a question
+
+        self.active_question_import = None  # Bulk import in progress, processed a chunk at a time by tick
+        self.active = True  # Is the game running?
+        self.live_status = False  # Whether the stream was live when last checked
+        self.live_status_expiry_time = 0  # Time after which the live status is checked again
+        self.permission_cache = {}  # (user, permission): (has permission, expiry time), cleared when settings are saved
+        self.message_templates = {}  # Compiled message strings from settings, keyed by setting name
+        self.currency_name = ""  # Name of the channel's currency, looked up when message strings are compiled
+
+    def start(self):
+        # Apply this game's settings, load the questions if no game has yet, and schedule the first question
+        self.settings.Save(self.settings_file)
+        self.settings.cooldown_between_questions = max(self.settings.cooldown_between_questions, 0)
+        self.settings.duration_of_questions = max(self.settings.duration_of_questions, 0)
+        self.question_expiry_time = self.settings.duration_of_questions * 60
+        self.compile_message_templates()
+
+        if self.settings.enable_game_detection:
+            if self.settings.twitch_channel_name == "":
+                log("Init: Game Detection has been enabled without being supplied a Twitch Username.",
+                    LoggingLevel.str_to_int.get("Fatal"))
+                raise AttributeError("Game Detection has been enabled without being supplied a Twitch Username.")
+            # The game is looked up in the background and applied by Tick once it is known
+            log("Init: Game detection is enabled. Identifying most recent game.",
+                LoggingLevel.str_to_int.get("Debug"))
+            self.game_detector.refresh(True)
+        self.load_trivia()
+        self.question_start_time = clock()
+        self.scheduler.schedule("question_start", self.question_start_time)
+        self.scheduler.schedule("question_file", clock())
+        self.scheduler.schedule("perf_report", clock())
+        self.replay_reward_ledger()
+
+    def tick(self):
+        # Called by Tick for every game
+
+        # Import the next chunk of questions from a bulk import
+        if self.active_question_import is not None:
+            try:
+                if self.active_question_import.process(import_chunk_size):
+                    log("Tick: Import finished: " + str(self.active_question_import),
+                        LoggingLevel.str_to_int.get("Info"))
+                    self.post("Import finished: " + str(self.active_question_import) + ".")
+                    self.active_question_import = None
+            except (IOError, OSError, ValueError, csv.Error) as e:
+                log("Tick: Import failed: " + str(e), LoggingLevel.str_to_int.get("Warn"))
+                self.post("Import failed after " + str(self.active_question_import) + ".")
+                self.active_question_import.close()
+                self.active_question_import = None
+                save_trivia()
+
+        # Keep the detected game up to date. Lookups run in the background, so this never waits on the network.
+        self.update_detected_game()
+
+        # Handle question events that are due. Nothing else needs to be checked until the next deadline.
+        for event in self.scheduler.pop_due(clock()):
+            self.run_scheduled_event(event)
+
+    @timed("Execute")
+    def execute(self, data):
+        # Most chat messages are neither trivia commands nor possible answers. Turn those away before
+        #   checking permissions or reading the message's tags.
+        is_command = data.Message.startswith("!trivia")
+        if not is_command and (not self.active or not self.could_be_answer(data.Message)):
+            return
+
+        # Algorithm to start trivia if the trivia has been paused. Requires admin permission.
+        if not self.active:
+            if data.Message == "!trivia start" and (
+                    self.has_permission(data.User, self.settings.permissions_admins) or is_script_creator(data)):
+                self.active = True
+                log("Trivia Start: Started with Command.", LoggingLevel.str_to_int.get("Info"))
+                self.post("Trivia started.")
+
+        # If (the streamer is live OR trivia can run when offline) and trivia is active...
+        if self.active and data.IsChatMessage() and (not self.settings.run_only_when_live or self.is_live()):
+            # Check if the chatter has administrator permissions. If so, see if they are running an admin command.
+            is_player_command = is_command and data.GetParamCount() > 1 and data.GetParam(1) in player_subcommands
+            if is_command and not is_player_command and (
+                    self.has_permission(data.User, self.settings.permissions_admins)
+                    or is_script_creator(data)) and data.GetParamCount() > 0:
+                subcommand = data.GetParam(1)
+
+                if subcommand == "stop":
+                    self.active = False
+                    flush_trivia()
+                    self.update_current_question_file("")
+                    log("Trivia Stop: Stopped with Command.", LoggingLevel.str_to_int.get("Info"))
+                    self.post("Trivia stopped.")
+
+                elif subcommand == "save":
+                    if save_trivia():
+                        self.post("Trivia saved.")
+
+                elif subcommand == "load":
+                    if data.GetParamCount() == 2 and len(self.current_pool) > 0:
+                        self.next_question()
+                        # No confirmation necessary - if a question is loaded successfully the result will be obvious
+                    elif data.GetParamCount() == 3:
+                        try:
+                            question_id = int(data.GetParam(2))
+                            if question_id not in self.current_pool:
+                                raise KeyError("No question with ID " + str(question_id) + " is currently in use.")
+                            self.next_question(question_id)
+                        except (ValueError, KeyError) as e:
+                            log("Trivia Load: Question could not be loaded: " + str(e),
+                                LoggingLevel.str_to_int.get("Warn"))
+                            self.post("Error loading question. "
+                                      "Was the supplied ID the ID of a question for the current game?")
+                    else:
+                        log("Trivia Load: Subcommand used, but no questions exist that can be loaded.",
+                            LoggingLevel.str_to_int.get("Info"))
+                        self.post("Cannot load questions - no questions exist.")
+
+                elif subcommand == "game":
+                    if data.GetParamCount() == 2:
+                        if self.settings.enable_game_detection:
+                            self.post("The currently active game is " + str(self.current_game) + ".")
+                        else:
+                            self.post("Game detection is currently disabled.")
+                    elif data.GetParam(2) == "detect":
+                        # The game is looked up in the background. Tick posts the game once the lookup ends.
+                        if self.settings.twitch_channel_name == "":
+                            self.post("Game detection requires a Twitch channel name.")
+                        else:
+                            self.game_detector.refresh(True)
+                            self.announce_detected_game = True
+                            self.game_detection_override = False
+                    elif data.GetParam(2) == "set":
+                        if data.GetParamCount() >= 4:
+                            self.current_game = ' '.join(data.Message.split(" ")[3:])
+                            self.load_trivia()
+                            self.post("Active game set to " + str(self.current_game) + ".")
+                            self.game_detection_override = True
+                        else:
+                            self.post("Command usage: !trivia game set <game name>")
+                    else:
+                        self.post("Command usage: !trivia game (detect)")
+
+                elif subcommand == "count":
+                    # Return a count of the number of questions available
+                    if data.GetParamCount() >= 3:
+                        # Count the questions of any game
+                        count_game = ' '.join(data.Message.split(" ")[2:])
+                        self.post("Questions from " + count_game + ": "
+                                  + str(len(game_pools.get(count_game, ()))) + ".")
+                    elif self.settings.enable_game_detection:
+                        # Also include the number of questions currently matching the game
+                        self.post("Total questions: " + str(
+                            len(question_store)) + ". Questions from " + self.current_game + ": " + str(
+                            len(self.current_pool)) + ".")
+                    else:
+                        self.post("Number of questions available: " + str(len(question_store)) + ".")
+
+                elif subcommand == "perf":
+                    if data.GetParamCount() > 2 and data.GetParam(2) == "reset":
+                        for counter in perf_counters.values():
+                            counter.__init__()
+                        self.post("Timings reset.")
+                    elif data.GetParamCount() > 2:
+                        self.post(get_perf_message(data.GetParam(2)))
+                    else:
+                        self.post(get_perf_message())
+
+                elif subcommand == "answers":
+                    if self.get_current_question() is None:
+                        self.post("No questions are currently loaded.")
+                    else:
+                        self.post("Answers to the current question: "
+                                  + ", ".join(self.get_current_question().get_answers()))
+
+                elif subcommand == "add":
+                    if data.GetParamCount() == 2:
+                        self.post("Syntax: !trivia add (game:<Game Name>,) (points:<Points>,) "
+                                  "question:<Question>, answers:<Pipe-Separated List of Answers>")
+                    else:
+                        # Get all of the required attributes from the message
+                        # Try/catch to make sure points was convertible to an int
+                        try:
+                            new_points = int(get_attribute("points", data.Message))
+                        except ValueError:
+                            log("Trivia Add: No point value was supplied. Using the default point value.",
+                                LoggingLevel.str_to_int.get("Debug"))
+                            new_points = self.settings.default_loyalty_point_value
+
+                        try:
+                            new_game = get_attribute("game", data.Message)
+                        except ValueError:
+                            # If the attribute is not found, check for a current game, otherwise display an error
+                            if not self.current_game == "":
+                                new_game = self.current_game
+                            else:
+                                log("Trivia Add: Question not added. No game attribute detected in command call.",
+                                    LoggingLevel.str_to_int.get("Warn"))
+                                self.post("Error: No game attribute detected. Please supply a game name.")
+                                return
 
-    #If their active game has changed, reload the current question list
-    if not previous_game == current_game:
-        log("NextQuestion: Game change detected. New game is " + str(current_game) + ". Loading new question set.", LoggingLevel.str_to_int.get("Info"))
-        load_trivia()
-    
+                        try:
+                            new_question_text = get_attribute("question", data.Message)
+                        except ValueError:
+                            # If the attribute is not found, display an error
+                            log("Trivia Add: Question not added. No question attribute detected in command call.",
+                                LoggingLevel.str_to_int.get("Warn"))
+                            self.post("Error: No question attribute detected.")
+                            return
+
+                        try:
+                            new_answers = get_attribute("answers", data.Message).split("|")
+                        except ValueError:
+                            # If the attribute is not found, display an error
+                            log("Trivia Add: Question not added. No answers attribute detected in command call.",
+                                LoggingLevel.str_to_int.get("Warn"))
+                            self.post("Error: No answers attribute detected. "
+                                      "A question cannot be added without valid answers.")
+                            return
+
+                        # strip all whitespace from the beginning and ends of the answers
+                        i = 0
+                        while i < len(new_answers):
+                            new_answers[i] = new_answers[i].strip()
+                            i = i + 1
+
+                        # create the Question object and add it to the list of questions,
+                        #   then save the new list of questions
+                        new_question = Question(game=new_game, points=new_points, question=new_question_text,
+                                                answers=new_answers)
+                        add_question(new_question)
+                        if journal_trivia({"Action": "add", "Question": new_question.toJSON()}):
+                            log("Trivia Add: A new question has been added: " + str(new_question),
+                                LoggingLevel.str_to_int.get("Info"))
+                            self.post("Question added with ID " + str(new_question.get_id()) + ".")
+
+                elif subcommand == "import":
+                    if data.GetParamCount() == 2:
+                        self.post("Syntax: !trivia import <File Name> "
+                                  "(CSV, JSON lines or JSON file in the script folder)")
+                    elif self.active_question_import is not None:
+                        self.post("An import is already in progress.")
+                    else:
+                        import_file = os.path.normpath(os.path.join(path_to_script,
+                                                                    ' '.join(data.Message.split(" ")[2:])))
+                        if not import_file.startswith(path_to_script + os.sep) or not os.path.isfile(import_file):
+                            self.post("Error: No file with that name exists in the script folder.")
+                        else:
+                            try:
+                                self.active_question_import = QuestionImport(
+                                    import_file, self.current_game, self.settings.default_loyalty_point_value)
+                                log("Trivia Import: Importing questions from " + import_file + ".",
+                                    LoggingLevel.str_to_int.get("Info"))
+                                self.post("Importing questions...")
+                            except ValueError as e:
+                                log("Trivia Import: Unable to read " + import_file + ": " + str(e),
+                                    LoggingLevel.str_to_int.get("Warn"))
+                                self.post("Error: " + str(e))
+
+                elif subcommand == "remove":
+                    if data.GetParamCount() == 2:
+                        self.post("Syntax: !trivia remove <Question ID>")
+                    else:
+                        try:
+                            question_id = int(data.GetParam(2))
+                            old_question = remove_question(question_id)
+                            if question_id == self.current_question_id:
+                                # The question is gone, so it ends without rewarding anyone
+                                self.end_question()
+                            if journal_trivia({"Action": "remove", "ID": question_id}):
+                                log("Trivia Remove: A question has been removed: " + str(old_question),
+                                    LoggingLevel.str_to_int.get("Info"))
+                                self.post("Question removed.")
+                        except (ValueError, KeyError) as e:
+                            log("Trivia Remove: Question could not be removed: " + str(e),
+                                LoggingLevel.str_to_int.get("Warn"))
+                            self.post("Error removing question. Was the supplied ID the ID of an existing question?")
+
+                elif subcommand == "modify":
+                    if data.GetParamCount() == 2:
+                        self.post("Syntax: !trivia modify <Question ID> (game:<New Value>,) (question:<New Value>,) "
+                                  "(points:<New Value>,) (answers <add/remove/set>: <New Value>|<New Value>| ...)")
+                    else:
+                        # Parameter two indicates the ID of the question
+                        try:
+                            question = question_store[int(data.GetParam(2))]
+                        except (ValueError, KeyError):
+                            # If parameter three was not a valid ID, display an error message
+                            log("Trivia Modify: Trivia Modify subcommand supplied an invalid question ID.",
+                                LoggingLevel.str_to_int.get("Warn"))
+                            self.post("Error: The supplied ID was not the ID of an existing question.")
+                            return
+                        log("Trivia Modify: Modifying question " + str(question.get_id()) + ".",
+                            LoggingLevel.str_to_int.get("Debug"))
+
+                        changes = False
+                        new_game = None
+                        new_question = None
+                        new_points = None
+                        new_answer_set = None
+                        new_answers = None
+                        old_answers = None
+                        if "game:" in data.Message:
+                            new_game = get_attribute("game", data.Message)
+                        if "question:" in data.Message:
+                            new_question = get_attribute("question", data.Message)
+                        if "points:" in data.Message:
+                            new_points = get_attribute("points", data.Message)
+                        if "answers set:" in data.Message:
+                            new_answer_set = get_attribute("answers set", data.Message).split(",")
+                        else:
+                            if "answers add:" in data.Message:
+                                new_answers = get_attribute("answers add", data.Message).split(",")
+                            if "answers remove:" in data.Message:
+                                old_answers = get_attribute("answers remove", data.Message).split(",")
+
+                        if new_question:
+                            question.set_question(new_question)
+                            changes = True
+                        if new_points:
+                            try:
+                                question.set_points(int(new_points))
+                                changes = True
+                            except ValueError as e:
+                                log("Trivia Modify: Trivia Modify subcommand supplied a non-integer point value.",
+                                    LoggingLevel.str_to_int.get("Warn"))
+                                self.post(
+                                    "Error: The supplied point value was not a number. "
+                                    "The question's point value was not changed.")
+                        if new_answer_set:
+                            question.set_answers(new_answer_set)
+                            changes = True
+                        else:
+                            current_answers = list(question.get_answers())
+                            if new_answers:
+                                for answer in new_answers:
+                                    if answer not in current_answers:
+                                        current_answers.append(answer)
+                                        current_answers.sort()
+                                        changes = True
+                            if old_answers:
+                                for answer in old_answers:
+                                    if answer in current_answers:
+                                        current_answers.remove(answer)
+                                        changes = True
+                            if changes:
+                                question.set_answers(current_answers)
+                        if new_game:
+                            set_question_game(question, new_game)
+                            changes = True
+
+                        if changes:
+                            if journal_trivia({"Action": "modify", "Question": question.toJSON()}):
+                                self.post("Question modified.")
+            elif is_command and not is_player_command and not (
+                    self.has_permission(data.User, self.settings.permissions_admins)
+                    or is_script_creator(data)) and data.GetParamCount() > 0:
+                log(data.UserName + " attempted to use trivia admin commands without permission. "
+                    + str(data.Message), LoggingLevel.str_to_int.get("Info"))
+                self.post(data.UserName + ", you do not have the permissions to use this command.")
+            if self.has_permission(data.User, self.settings.permissions_players) or is_script_creator(data):
+                if str(data.Message) == "!trivia":
+                    if len(self.current_pool) == 0:
+                        log("!Trivia: Called to start new question, but no questions exist.",
+                            LoggingLevel.str_to_int.get("Warn"))
+                        if self.settings.enable_game_detection and len(question_store) > 0:
+                            self.post("Could not load trivia. No questions exist for the current game.")
+                        else:
+                            self.post("Could not load trivia. No questions exist.")
+                    elif self.current_question_id == -1:
+                        if (not self.settings.automatically_run_next_question) and self.ready_for_next_question:
+                            log("!Trivia: Called to start new question.", LoggingLevel.str_to_int.get("Debug"))
+                            self.next_question()
+                        else:
+                            log("!Trivia: There is no active trivia question.", LoggingLevel.str_to_int.get("Info"))
+                            if self.settings.display_next_question_time:
+                                self.post("There is no active trivia question. The next trivia question arrives in "
+                                          + str(datetime.fromtimestamp(self.question_start_time - clock()).strftime(
+                                              '%M minutes and %S seconds.')))
+                            else:
+                                self.post("There is no active trivia question.")
+                    else:
+                        self.post(self.parse_string("question_ask_string") + " Time remaining: " + str(
+                            datetime.fromtimestamp(self.question_expiry_time - clock()).strftime(
+                                '%M minutes and %S seconds.')))
+                elif is_player_command:
+                    if data.GetParam(1) == "top":
+                        self.post(self.get_leaderboard_message())
+                    elif data.GetParamCount() > 2:
+                        self.post(self.get_user_stats_message(data.GetParam(2)))
+                    else:
+                        self.post(self.get_user_stats_message(data.UserName))
+                elif self.current_question_id != -1:
+                    self.check_for_match(data)
+
+    def reload_settings(self, jsonData):
+        # Execute json reloading here
+        log("ReloadSettings: Saving settings from Chatbot UI...", LoggingLevel.str_to_int.get("Info"))
+        previous_game_detection = self.settings.enable_game_detection
+        previous_twitch_channel_name = self.settings.twitch_channel_name
+        previous_duration_of_questions = self.settings.duration_of_questions
+        previous_cooldown_between_questions = self.settings.cooldown_between_questions
+        self.settings.Reload(jsonData)
+        self.settings.Save(self.settings_file)
+        self.compile_message_templates()
+
+        # Permission settings may have changed, so check permissions and the live status again
+        self.permission_cache.clear()
+        self.live_status_expiry_time = 0
+        flush_trivia()
+
+        # Answer matching options may have changed, so rebuild the current question's answer matcher
+        if self.get_current_question() is not None:
+            self.answer_matcher = self.create_answer_matcher(self.get_current_question())
+
+        # If the user disabled the usage of the script file, empty the file so the on screen display goes away
+        if not self.settings.create_current_question_file:
+            self.update_current_question_file("")
+
+        # If the duration of a question changed and there was a question active, we need to adjust the time
+        #   accordingly
+        if not self.current_question_id == -1 and \
+                not previous_duration_of_questions == self.settings.duration_of_questions:
+            self.question_expiry_time = self.question_expiry_time + (
+                    self.settings.duration_of_questions - previous_duration_of_questions) * 60
+            self.scheduler.schedule("question_end", self.question_expiry_time)
+
+        # If the duration between questions changed and there is no question active, we need to adjust the time
+        #   accordingly
+        if self.current_question_id == -1 and \
+                not previous_cooldown_between_questions == self.settings.cooldown_between_questions:
+            self.question_start_time = self.question_start_time + (
+                    self.settings.cooldown_between_questions - previous_cooldown_between_questions) * 60
+
+        # Check the next question again, in case it should now start automatically, and refresh the current
+        #   question file in case it was just enabled
+        if self.current_question_id == -1:
+            self.scheduler.schedule("question_start", self.question_start_time)
+        self.scheduler.schedule("question_file", clock())
+
+        # If the user has toggled game detection, reload the current question list and update current game
+        if not previous_game_detection == self.settings.enable_game_detection:
+            if not self.settings.enable_game_detection:
+                self.current_game = ""
+                log("ReloadSettings: Game Detection deactivated. Reloading questions.",
+                    LoggingLevel.str_to_int.get("Info"))
+            else:
+                # The detected game is applied by Tick once the lookup ends
+                if self.settings.twitch_channel_name == "":
+                    log("ReloadSettings: Game Detection has been enabled without being supplied a Twitch Username.",
+                        LoggingLevel.str_to_int.get("Warn"))
+                self.game_detector.reset()
+                self.game_detector.refresh(True)
+                log("ReloadSettings: Game Detection activated. Identifying most recent game.",
+                    LoggingLevel.str_to_int.get("Info"))
+
+            self.load_trivia()
+        elif self.settings.enable_game_detection and \
+                not previous_twitch_channel_name == self.settings.twitch_channel_name:
+            # The channel changed, so the previously detected game no longer applies
+            self.game_detector.reset()
+            self.game_detector.refresh(True)
+
+        log("ReloadSettings: Settings saved and applied successfully", LoggingLevel.str_to_int.get("Info"))
+
+    def load_trivia(self):
+        # Questions are loaded from file the first time any game calls this. Afterwards, only the pool of
+        #   questions this game uses is changed, depending on game detection.
+
+        # If there is a question currently running, end that question.
+        if self.current_question_id != -1:
+            self.end_question()
+
+        if all_questions is None:
+            load_questions()
+
+        # Use the pool of questions matching the settings. Pools are shared rather than copied,
+        #   so adding and removing questions keeps them up to date.
+        if not self.settings.enable_game_detection:
+            # User is not using game detection. Use every question.
+            self.current_pool = all_questions
+        else:
+            # User is using game detection. Use the pool of their current game.
+            self.current_pool = get_game_pool(self.current_game)
+        self.discard_prepared_question()
+        log("LoadTrivia: Questions loaded: " + str(
+            len(question_store)) + ". Questions currently being used: " + str(len(self.current_pool)),
+            LoggingLevel.str_to_int.get("Info"))
+
+    def run_scheduled_event(self, event):
+        if event == "payout":
+            # Winners are paid even if trivia has been stopped since they won
+            self.pay_pending_rewards()
+            return
+        if event == "perf_report":
+            self.write_perf_report()
+            return
+
+        if not (self.active and (not self.settings.run_only_when_live or self.is_live())):
+            # Trivia is stopped or the stream is offline. Check again shortly.
+            self.scheduler.schedule(event, clock() + 1)
+            return
+
+        if event == "question_end":
+            # The question has expired. End the question.
+            if not self.current_question_id == -1:
+                log("Tick: Question time exceeded. Ending question.", LoggingLevel.str_to_int.get("Debug"))
+                self.end_question()
+
+        elif event == "question_start":
+            # It is time for the next question.
+            if self.current_question_id == -1:
+                if self.settings.automatically_run_next_question:
+                    # If the settings indicate to run the next question, do so.
+                    log("Tick: Starting next question.", LoggingLevel.str_to_int.get("Debug"))
+                    self.next_question()
+                else:
+                    # If the settings indicate to NOT run the next question,
+                    #   set the boolean and display that the next question is ready.
+                    self.ready_for_next_question = True
+                    if not self.scheduler.is_scheduled("readiness_notification"):
+                        self.scheduler.schedule("readiness_notification", clock())
+                    if self.settings.create_current_question_file:
+                        self.refresh_current_question_file()
+
+        elif event == "readiness_notification":
+            # Remind chat every 10 minutes that the next question is waiting to be started
+            if self.current_question_id == -1 and self.ready_for_next_question and \
+                    not self.settings.automatically_run_next_question:
+                if not self.settings.create_current_question_file and len(self.current_pool) > 0:
+                    self.post("The next question is ready! Type !trivia to begin.")
+                self.scheduler.schedule("readiness_notification", clock() + (10 * 60))
+
+        elif event == "question_file":
+            self.refresh_current_question_file()
+
+        elif event == "question_prepare":
+            self.prepare_next_question()
+
+    def record_award(self, question_id, winners, points):
+        # The award is written to the reward ledger before anything is paid, so a crash part way through
+        #   paying leaves a record of who is still owed points. Every question is recorded, including those
+        #   nobody answered or that gave no points, so the ledger holds every win and every streak.
+        award_id = self.next_award_id
+        self.next_award_id = self.next_award_id + 1
+        times = dict((user_id, self.answer_times[user_id]) for user_id in winners if user_id in self.answer_times)
+        self.write_reward_ledger([{"Action": "award", "Award": award_id, "Question": question_id,
+                                   "Time": int(clock()), "Points": points, "Winners": dict(winners), "Times": times}])
+        self.update_user_stats(winners, points, times)
+        if points > 0:
+            for user_id, username in winners.items():
+                self.queue_payout(award_id, user_id, username, points)
+
+    def queue_payout(self, award_id, user_id, username, points):
+        # Queuing a payout that is already pending does nothing, so replaying the ledger never pays twice
+        if (award_id, user_id) not in self.pending_payouts:
+            self.pending_payouts[(award_id, user_id)] = [username, points, 0]
+        if not self.scheduler.is_scheduled("payout"):
+            self.scheduler.schedule("payout", clock())
+
+    @timed("pay_pending_rewards")
+    def pay_pending_rewards(self):
+        # Pay pending rewards with a single AddPointsAll call where the Chatbot has it. Otherwise pay a chunk
+        #   of winners with AddPoints each Tick. Failed payouts stay pending and are tried again later.
+        #   Each payout's outcome is written to the reward ledger once it is known. A crash between a payout
+        #   and its ledger record means that payout is made again on the next start.
+        failed = set()
+        if hasattr(self.parent, "AddPointsAll"):
+            # AddPointsAll takes one amount per user, so a user owed several rewards is paid one per call
+            batch = []
+            users = set()
+            for key, payout in self.pending_payouts.items():
+                if key[1] not in users:
+                    users.add(key[1])
+                    batch.append((key, payout))
+            try:
+                # AddPointsAll returns the IDs of users who could not be paid
+                failed_users = set(self.parent.AddPointsAll(dict((key[1], payout[1]) for key, payout in batch))
+                                   or [])
+            except Exception as e:
+                log("PayPendingRewards: Unable to pay rewards: " + str(e), LoggingLevel.str_to_int.get("Warn"))
+                failed_users = users
+            failed.update(key for key, payout in batch if key[1] in failed_users)
+        else:
+            batch = list(self.pending_payouts.items())[:payout_chunk_size]
+            for key, payout in batch:
+                try:
+                    if not self.parent.AddPoints(key[1], payout[0], payout[1]):
+                        failed.add(key)
+                except Exception as e:
+                    log("PayPendingRewards: Unable to pay " + payout[0] + ": " + str(e),
+                        LoggingLevel.str_to_int.get("Warn"))
+                    failed.add(key)
+
+        paid_users = {}  # Award ID: users paid
+        abandoned_users = {}  # Award ID: users given up on
+        for key, payout in batch:
+            if key not in failed:
+                del self.pending_payouts[key]
+                paid_users.setdefault(key[0], []).append(key[1])
+                continue
+            payout[2] = payout[2] + 1
+            if payout[2] >= payout_attempt_limit:
+                log("PayPendingRewards: Giving up on paying " + str(payout[1]) + " " + self.currency_name + " to "
+                    + payout[0] + " after " + str(payout[2]) + " attempts.", LoggingLevel.str_to_int.get("Warn"))
+                del self.pending_payouts[key]
+                abandoned_users.setdefault(key[0], []).append(key[1])
+        self.write_reward_ledger([{"Action": "paid", "Award": award_id, "Users": users}
+                                  for award_id, users in paid_users.items()]
+                                 + [{"Action": "abandoned", "Award": award_id, "Users": users}
+                                    for award_id, users in abandoned_users.items()])
+
+        if self.pending_payouts:
+            self.scheduler.schedule("payout", clock() + (payout_retry_delay_in_seconds if failed else 0))
+
+    def update_user_stats(self, winners, points, times):
+        # Called once for each question that ends. Each winner's rank is moved with a binary search,
+        #   so the leaderboard stays sorted without being rebuilt.
+        for user_id in [user_id for user_id in self.streak_holders if user_id not in winners]:
+            self.user_stats[user_id].streak = 0
+            self.streak_holders.discard(user_id)
+
+        for user_id, username in winners.items():
+            stats = self.user_stats.get(user_id)
+            if stats is None:
+                stats = UserStats(user_id, username)
+                self.user_stats[user_id] = stats
+            else:
+                del self.leaderboard[bisect.bisect_left(self.leaderboard, stats.get_rank_key())]
+                if stats.username != username:
+                    # The user has changed their name
+                    self.user_ids_by_name.pop(stats.username.lower(), None)
+                    stats.username = username
+            self.user_ids_by_name[username.lower()] = user_id
+
+            stats.wins = stats.wins + 1
+            stats.points = stats.points + points
+            stats.streak = stats.streak + 1
+            stats.best_streak = max(stats.best_streak, stats.streak)
+            self.streak_holders.add(user_id)
+            if user_id in times and (stats.fastest_answer is None or times[user_id] < stats.fastest_answer):
+                stats.fastest_answer = times[user_id]
+            bisect.insort(self.leaderboard, stats.get_rank_key())
+
+    def get_leaderboard_message(self):
+        if not self.leaderboard:
+            return "Nobody has won any trivia yet."
+        entries = []
+        for rank, key in enumerate(self.leaderboard[:leaderboard_size]):
+            stats = self.user_stats[key[2]]
+            entries.append(str(rank + 1) + ". " + stats.username + " (" + str(stats.wins)
+                           + (" win)" if stats.wins == 1 else " wins)"))
+        return "Top trivia players: " + ", ".join(entries) + "."
+
+    def get_user_stats_message(self, username):
+        user_id = self.user_ids_by_name.get(username.lstrip("@").lower())
+        if user_id is None:
+            return "No trivia wins recorded for " + username + "."
+        stats = self.user_stats[user_id]
+        rank = bisect.bisect_left(self.leaderboard, stats.get_rank_key()) + 1
+        message = stats.username + ": " + str(stats.wins) + (" win" if stats.wins == 1 else " wins") \
+            + " (rank " + str(rank) + "), " + str(stats.points) + " " + self.currency_name + " won"
+        if stats.fastest_answer is not None:
+            message = message + ", fastest answer " + str(stats.fastest_answer) + " seconds"
+        return message + ", current streak " + str(stats.streak) + ", best streak " + str(stats.best_streak) + "."
+
+    def write_reward_ledger(self, records):
+        # Records are appended and flushed to disk straight away. The ledger is never rewritten.
+        if not records:
+            return
+        try:
+            with open(self.rewards_ledger_file, 'ab') as ledger:
+                ledger.write(to_bytes("".join(json.dumps(record) + "\n" for record in records)))
+                ledger.flush()
+                os.fsync(ledger.fileno())
+        except (IOError, OSError) as e:
+            log("WriteRewardLedger: Unable to record rewards: " + str(e), LoggingLevel.str_to_int.get("Fatal"))
+
+    def read_reward_ledger(self):
+        # Yields every record in the reward ledger. A record cut short by a crash is skipped.
+        if not os.path.exists(self.rewards_ledger_file):
+            return
+        with open(self.rewards_ledger_file, 'rb') as ledger:
+            for line in ledger:
+                try:
+                    yield json.loads(line.decode("utf-8"))
+                except ValueError:
+                    log("ReadRewardLedger: Skipping unreadable record.", LoggingLevel.str_to_int.get("Warn"))
+
+    def replay_reward_ledger(self):
+        # Queue every payout the ledger does not show as paid or abandoned, such as those interrupted by a crash.
+        #   User stats are rebuilt along the way.
+
+        # A record cut short by a crash has no line ending. End it, so the next record starts on its own line.
+        if os.path.exists(self.rewards_ledger_file) and os.path.getsize(self.rewards_ledger_file) > 0:
+            with open(self.rewards_ledger_file, 'rb+') as ledger:
+                ledger.seek(-1, os.SEEK_END)
+                if ledger.read(1) != to_bytes("\n"):
+                    ledger.write(to_bytes("\n"))
+
+        unpaid_awards = {}  # Award ID: (points, {user ID: username} still unpaid)
+        for record in self.read_reward_ledger():
+            action = record.get("Action")
+            if action == "award":
+                self.next_award_id = max(self.next_award_id, record["Award"] + 1)
+                self.update_user_stats(record.get("Winners", {}), record.get("Points", 0), record.get("Times", {}))
+                if record.get("Points", 0) > 0:
+                    unpaid_awards[record["Award"]] = (record["Points"], dict(record["Winners"]))
+            elif action in ("paid", "abandoned") and record.get("Award") in unpaid_awards:
+                for user_id in record["Users"]:
+                    unpaid_awards[record["Award"]][1].pop(user_id, None)
+
+        unpaid_count = 0
+        for award_id, (points, winners) in unpaid_awards.items():
+            for user_id, username in winners.items():
+                self.queue_payout(award_id, user_id, username, points)
+                unpaid_count = unpaid_count + 1
+        if unpaid_count > 0:
+            log("ReplayRewardLedger: Paying " + str(unpaid_count) + " rewards left unpaid when the script last ran.",
+                LoggingLevel.str_to_int.get("Info"))
+
+    def write_perf_report(self):
+        # Write every counter to perf.json for other tools to read, if reports are turned on in settings
+        if self.settings.perf_report_interval_in_seconds <= 0:
+            self.scheduler.schedule("perf_report", clock() + 60)  # Check again in case reports are turned on
+            return
+        report = {"Time": int(time.time()),
+                  "Counters": dict((name, counter.toJSON()) for name, counter in perf_counters.items())}
+        try:
+            write_file_atomically(self.perf_report_file, to_bytes(json.dumps(report, sort_keys=True)), sync=False)
+        except (IOError, OSError) as e:
+            log("WritePerfReport: Unable to write the perf report: " + str(e), LoggingLevel.str_to_int.get("Warn"))
+        self.scheduler.schedule("perf_report", clock() + max(self.settings.perf_report_interval_in_seconds, 1))
+
+    def refresh_current_question_file(self):
+        # Display the current question, or the time until the next question, in the current question file
+        if not self.settings.create_current_question_file:
+            return
+        if not self.current_question_id == -1:
+            # Display the question and the remaining time.
+            self.update_current_question_file(self.parse_string("question_file_ask_string"),
+                                              self.settings.question_file_refresh_interval_in_seconds)
+        elif self.ready_for_next_question and not self.settings.automatically_run_next_question:
+            self.update_current_question_file("The next question is ready! Type !trivia to begin.", 86400)
+        else:
+            # Display the remaining time until the next question.
+            self.update_current_question_file("Time until next question: " + str(
+                datetime.fromtimestamp(max(self.question_start_time - clock(), 0)).strftime('%M:%S')) + ".",
+                self.settings.question_file_refresh_interval_in_seconds)
+
+    @timed("check_for_match")
+    def check_for_match(self, data):
+        current_question = self.get_current_question()
+        if current_question is None:
+            # Another channel removed the question. End it so the next question is still scheduled.
+            self.end_question()
+        elif self.answer_matcher.match(data.Message):
+            # We have a match. Add them to the dictionary of correct users,
+            #   then check to see if the question needs to be ended.
+            self.correct_users_dict[data.User] = data.UserName
+            if data.User not in self.answer_times:
+                self.answer_times[data.User] = round(clock() - self.question_asked_time, 2)
+            log("CheckForMatch: Match detected for message %s. User %s added to the list of correct users.",
+                LoggingLevel.str_to_int.get("Debug"), data.Message, data.UserName)
+            log("CheckForMatch: There are currently %s winners out of a maximum of %s. The grace period is "
+                "currently %s.", LoggingLevel.str_to_int.get("Debug"),
+                len(self.correct_users_dict), self.settings.number_of_winners, self.settings.enable_grace_period)
+            # Check to see if the maximum number of winners has been met
+            if 0 < self.settings.number_of_winners <= len(self.correct_users_dict):
+                log("CheckForMatch: Number of winners achieved. Ending question.",
+                    LoggingLevel.str_to_int.get("Debug"))
+                # If it has, immediately end the question
+                self.end_question()
+            else:
+                # If the maximum number of winners has not been met, but the grace period is being
+                #   used, apply the grace period to end the question if it has not already been applied
+                if self.settings.enable_grace_period:
+                    if not self.grace_period_used:
+                        self.question_expiry_time = clock() + self.settings.grace_period_duration_in_seconds
+                        self.scheduler.schedule("question_end", self.question_expiry_time)
+                        self.grace_period_used = True
+
+    @timed("end_question")
+    def end_question(self):
+
+        # First, check to see if there is an active question.
+        #   If there is no active question, nothing needs to be done.
+        current_question = self.get_current_question()
+        if current_question is not None:
+            # Check to see if there were any correct answers.
+            if len(self.correct_users_dict) > 0:
+                log("EndQuestion: Winners detected. Distributing points.", LoggingLevel.str_to_int.get("Debug"))
+                # Work out the reward once, then queue every winner's payout. Payouts are made by Tick,
+                #   in bulk where possible, so ending a question with many winners does not stall.
+                correct_usernames = list(self.correct_users_dict.values())
+                if self.settings.enable_loyalty_point_rewards:
+                    # Determine if points are being divided amongst winners
+                    if self.settings.enable_points_dividing:
+                        reward = int(ceil(self.current_question_points / len(self.correct_users_dict)))
+                    else:
+                        reward = self.current_question_points
+                    log("EndQuestion: Adding %s %s to each of %s users.", LoggingLevel.str_to_int.get("Debug"),
+                        reward, self.currency_name, len(self.correct_users_dict))
+                else:
+                    reward = 0
+                self.record_award(self.current_question_id, self.correct_users_dict, reward)
+                correct_usernames.sort()    # Sort the list of winning usernames alphabetically
+
+                # Reduce the reward for that question, if desired
+                if self.settings.percent_loyalty_point_value_decrease_on_answered > 0:
+                    # Get the question's current points.
+                    question_points = current_question.get_points()
+                    # Determine the new points by multiplying the current points by a multiplier.
+                    new_points = int(question_points - (question_points * (
+                            self.settings.percent_loyalty_point_value_decrease_on_answered / 100.0)))
+                    # Assign the new value.
+                    current_question.set_points(new_points)
+                    journal_trivia({"Action": "points", "ID": self.current_question_id, "Points": new_points})
+                    log("EndQuestion: Reducing points for question " + str(self.current_question_id) + " by " +
+                        str(self.settings.percent_loyalty_point_value_decrease_on_answered) + " percent. (" + str(
+                        question_points) + " - " +
+                        str(int(question_points
+                                * (self.settings.percent_loyalty_point_value_decrease_on_answered
+                                   / 100.0))) + " = " + str(new_points) + ")"
+                        , LoggingLevel.str_to_int.get("Debug"))
+
+                # Post message rewarding users
+                if self.settings.create_current_question_file:
+                    self.update_current_question_file(
+                        self.parse_string("question_file_reward_string", winners=correct_usernames), 10)
+                else:
+                    if self.settings.cooldown_between_questions > 0:
+                        self.post(self.parse_string("question_reward_string", winners=correct_usernames))
+                    else:
+                        self.post(self.parse_string("question_reward_string", winners=correct_usernames))
+            else:
+                # No winners were detected. The question is still recorded, as it ends everyone's streak.
+                self.record_award(self.current_question_id, {}, 0)
+
+                # Display expiration message.
+                if self.settings.create_current_question_file:
+                    self.update_current_question_file(self.parse_string("question_expiration_string"), 10)
+                else:
+                    self.post(self.parse_string("question_expiration_string"))
+
+                # Increase the reward for that question, if desired.
+                if int(self.settings.percent_loyalty_point_value_increase_on_unanswered) > 0:
+                    # Get the question's current points.
+                    question_points = current_question.get_points()
+                    # Determine the new points by multiplying the current points by a multiplier.
+                    new_points = int(question_points + question_points * (
+                            self.settings.percent_loyalty_point_value_increase_on_unanswered / 100.0))
+                    # Assign the new value.
+                    current_question.set_points(new_points)
+                    journal_trivia({"Action": "points", "ID": self.current_question_id, "Points": new_points})
+                    log("EndQuestion: Increasing points for question " + str(self.current_question_id) + " by " +
+                        str(self.settings.percent_loyalty_point_value_increase_on_unanswered) + " percent. (" + str(
+                        question_points) + " + " +
+                        str(int(question_points
+                                * (self.settings.percent_loyalty_point_value_increase_on_unanswered
+                                   / 100.0))) + " = " + str(new_points) + ")"
+                        , LoggingLevel.str_to_int.get("Debug"))
+
+        # Clear the winners dictionary for use with the next question. Winners of a question that was removed
+        #   while it was running are not rewarded.
+        self.correct_users_dict.clear()
+        self.answer_times.clear()
+
+        # End current question and set the next question's start time.
+        self.current_question_id = -1
+        self.answer_matcher = None
+        random_cooldown_multiplier = 1
+        settings = self.settings
+        if settings.randomize_question_cooldown:
+            if settings.question_cooldown_random_upper_bound > settings.question_cooldown_random_lower_bound:
+                random_cooldown_multiplier = \
+                    float(self.parent.GetRandom(settings.question_cooldown_random_lower_bound,
+                                                settings.question_cooldown_random_upper_bound)) / 100
+            elif settings.question_cooldown_random_lower_bound > settings.question_cooldown_random_upper_bound:
+                random_cooldown_multiplier = \
+                    float(self.parent.GetRandom(settings.question_cooldown_random_upper_bound,
+                                                settings.question_cooldown_random_lower_bound)) / 100
+            else:
+                random_cooldown_multiplier = settings.point_value_random_lower_bound
+        self.question_start_time = clock() + (settings.cooldown_between_questions * 60 * random_cooldown_multiplier)
+        self.scheduler.cancel("question_end")
+        self.scheduler.schedule("question_start", self.question_start_time)
+        self.scheduler.schedule("question_prepare", clock())
+
+        self.grace_period_used = False
+        self.ready_for_next_question = False
+
+    @timed("next_question")
+    def next_question(self, question_id=-1):
+        # Check to see if questions exist
+        if len(self.current_pool) > 0:
+
+            # Start up a new question. Every question in the pool is asked once before any is asked again.
+            #   The question prepared during the cooldown is used if there is one, so that little is left to do.
+            #   The prepared question is dropped when a specific question is loaded, and prepared again afterwards.
+            prepared = self.take_prepared_question()
+            if prepared is not None and question_id == -1:
+                self.current_question_id, self.current_question_points, ask_message, self.answer_matcher = prepared
+            else:
+                if question_id == -1:
+                    question_id = self.current_pool.pick(lambda count: self.parent.GetRandom(0, count))
+                self.current_question_id = question_id
+                current_question = question_store[self.current_question_id]
+                # Build the answer matcher up front so answer checks during the question are cheap
+                self.answer_matcher = self.create_answer_matcher(current_question)
+                self.current_question_points = self.get_question_points(current_question)
+                ask_message = None
+            mark_question_asked(self.current_question_id)
+
+            # If we are not logging to a file, post the question in chat. File display is handled by tick().
+            if not self.settings.create_current_question_file:
+                self.post(ask_message if ask_message is not None else self.parse_string("question_ask_string"))
+
+            # Set the question expiration time
+            self.question_asked_time = clock()
+            self.answer_times.clear()
+            self.question_expiry_time = clock() + (self.settings.duration_of_questions * 60)
+            self.scheduler.cancel("question_start")
+            self.scheduler.cancel("readiness_notification")
+            self.scheduler.schedule("question_end", self.question_expiry_time)
+            if self.settings.create_current_question_file:
+                self.scheduler.schedule("question_file", clock())
+            log("NextQuestion: Next Question at "
+                + datetime.fromtimestamp(self.question_expiry_time).strftime('%H:%M:%S') + ".",
+                LoggingLevel.str_to_int.get("Debug"))
+            self.ready_for_next_question = False
+        elif self.settings.enable_game_detection and not self.game_detection_override \
+                and self.game_detector.game is None:
+            # The game has not been detected yet, so there is no pool of questions to use. Try again shortly.
+            log("NextQuestion: Waiting for game detection. Trying again in 5 seconds.",
+                LoggingLevel.str_to_int.get("Debug"))
+            self.question_start_time = clock() + 5
+            self.scheduler.schedule("question_start", self.question_start_time)
+        else:
+            # If questions do not exist, try again every 60 seconds
+            log("NextQuestion: No questions exist. Trying again in 60 seconds.", LoggingLevel.str_to_int.get("Warn"))
+            self.question_start_time = clock() + 60
+            self.scheduler.schedule("question_start", self.question_start_time)
+
+    def get_question_points(self, question):
+        # The points a question is worth when asked, with random point scaling applied if it is in effect
+        settings = self.settings
+        if str(settings.reward_scaling).lower() == "random":
+            # Perform some conditionals to make sure that everything works no matter
+            #   which numbers are entered in which box
+            if settings.point_value_random_upper_bound > settings.point_value_random_lower_bound:
+                random_value_multiplier = float(self.parent.GetRandom(settings.point_value_random_lower_bound,
+                                                                      settings.point_value_random_upper_bound)) / 100
+            elif settings.point_value_random_lower_bound > settings.point_value_random_upper_bound:
+                random_value_multiplier = float(self.parent.GetRandom(settings.point_value_random_upper_bound,
+                                                                      settings.point_value_random_lower_bound)) / 100
+            else:
+                random_value_multiplier = settings.point_value_random_lower_bound
+            return int(ceil(question.get_points() * random_value_multiplier))
+        return question.get_points()
+
+    def prepare_next_question(self):
+        # Do the work of starting the next question ahead of time, during the cooldown: pick the question,
+        #   read it, build its answer matcher, work out its points and fill in its ask message
+        if self.current_question_id != -1 or self.prepared_question is not None or len(self.current_pool) == 0:
+            return
+        question_id = self.current_pool.pick(lambda count: self.parent.GetRandom(0, count))
+        question = question_store[question_id]
+        answer_matcher = self.create_answer_matcher(question)
+        points = self.get_question_points(question)
+        ask_message = None
+        if not self.settings.create_current_question_file and \
+                not self.message_templates["question_ask_string"].uses_time:
+            ask_message = self.parse_string("question_ask_string", question_id=question_id, points=points)
+        self.prepared_question = (self.current_pool, question_id, points, ask_message, answer_matcher)
+
+    def take_prepared_question(self):
+        # Returns the ID, points, ask message and answer matcher of the prepared question, or None if there is none or
+        #   the pool of questions in use has changed since it was prepared
+        prepared = self.prepared_question
+        self.prepared_question = None
+        if prepared is None or prepared[0] is not self.current_pool or prepared[1] not in self.current_pool:
+            return None
+        return prepared[1:]
+
+    def discard_prepared_question(self):
+        # Called when questions or settings change, since the prepared question may no longer be right.
+        #   It is prepared again on the next Tick.
+        if self.prepared_question is not None:
+            self.prepared_question = None
+            self.scheduler.schedule("question_prepare", clock())
+
+    def question_changed(self, question_id):
+        # Called by journal_trivia whenever any game changes a question
+        if question_id == self.current_question_id:
+            if self.get_current_question() is None:
+                # Another channel removed the question this game is asking. It ends without rewarding anyone.
+                self.end_question()
+            else:
+                self.answer_matcher = self.create_answer_matcher(self.get_current_question())
+        self.discard_prepared_question()
+
+    def create_answer_matcher(self, question):
+        # Normalize every answer once so that matching a chat message is cheap. Matching options are settings,
+        #   so each game builds its own matcher rather than keeping one on the shared question.
+        return AnswerMatcher(question.get_answers(),
+                             tolerant=self.settings.enable_tolerant_matching,
+                             typo_tolerance=self.settings.answer_typo_tolerance)
+
+    def parse_string(self, setting_name, winners=(), question_id=None, points=None):
+        # Apply question attributes to one of the message strings from settings. The current question is used
+        #   unless another question's ID and points are supplied.
+        return self.message_templates[setting_name].render(self, winners, question_id, points)
+
+    def compile_message_templates(self):
+        # Called when settings are loaded or saved, so messages are not re-parsed every time they are shown
+        self.currency_name = str(self.parent.GetCurrencyName())
+        self.message_templates.clear()
+        for setting_name in message_template_settings:
+            self.message_templates[setting_name] = MessageTemplate(getattr(self.settings, setting_name))
+        self.discard_prepared_question()
+
+    def get_message_parameter(self, parameter, winners=(), question_id=None, points=None):
+        # Parameters describe the current question, unless another question's ID and points are supplied
+        if question_id is None:
+            question_id = self.current_question_id
+            points = self.current_question_points
+        current_question = question_store.get(question_id)
+        if current_question is None and parameter in ("question", "answers", "game"):
+            # The question has been removed, so there is nothing to show
+            return ""
+        if parameter == "index":
+            # The ID of the current question
+            return str(question_id)
+        elif parameter == "currency":
+            # The name of the channel's currency
+            return self.currency_name
+        elif parameter == "question":
+            # The text of the current question
+            return current_question.get_question()
+        elif parameter == "pointswon":
+            # The points won by each person
+            if self.settings.enable_loyalty_point_rewards and len(self.correct_users_dict) > 0:
+                if self.settings.enable_points_dividing:
+                    return str(abs(points / len(self.correct_users_dict)))
+                return str(points)
+            # If nobody is winning points, show 0
+            return "0"
+        elif parameter == "points":
+            # The points of the current question
+            return str(points)
+        elif parameter == "answers":
+            # A list of correct answers for the current question
+            return ", ".join(current_question.get_answers())
+        elif parameter == "game":
+            # The game of the current question
+            return current_question.get_game()
+        elif parameter == "winnerspossible":
+            # The number of possible winners
+            return str(self.settings.number_of_winners)
+        elif parameter == "winnercount":
+            # The number of actual winners
+            return str(len(self.correct_users_dict))
+        elif parameter == "winnerlist":
+            # A list of users that answered the current question correctly
+            if len(winners) > 2:
+                return ', '.join(winners[:-1]) + ", and " + str(winners[-1])
+            elif len(winners) == 2:
+                return ' and '.join(winners)
+            elif winners:
+                return winners[0]
+            return "$winnerlist"
+        elif parameter == "timeremaining":
+            # The remaining time of the current question
+            return str(datetime.fromtimestamp(self.question_expiry_time - clock()).strftime(
+                '%M minutes and %S seconds'))
+        elif parameter == "time":
+            # The time between questions
+            return str(datetime.fromtimestamp(self.question_start_time - clock()).strftime(
+                '%M minutes and %S seconds.'))
+        return "$" + parameter
+
+    def get_current_question(self):
+        # Returns the current question, or None if there is no current question
+        return question_store.get(self.current_question_id)
+
+    def is_live(self):
+        # Checking across the Chatbot bridge is slow, so the live status is reused for a few seconds
+        if clock() >= self.live_status_expiry_time:
+            self.live_status = self.parent.IsLive()
+            self.live_status_expiry_time = clock() + live_status_cache_duration_in_seconds
+        return self.live_status
+
+    def has_permission(self, user, permission):
+        # Permission checks are reused for a minute, so busy chat does not check every message across the bridge
+        key = (user, permission)
+        cached = self.permission_cache.get(key)
+        if cached is not None and clock() < cached[1]:
+            return cached[0]
+        if len(self.permission_cache) >= permission_cache_limit:
+            self.permission_cache.clear()
+        result = self.parent.HasPermission(user, permission, "")
+        self.permission_cache[key] = (result, clock() + permission_cache_duration_in_seconds)
+        return result
+
+    @timed("post")
+    def post(self, message):
+        self.parent.SendStreamMessage(message)
+
+    @timed("update_current_question_file")
+    def update_current_question_file(self, line=None, duration_in_seconds=1):
+        # The file is only written when its text changes, and is swapped into place whole so that
+        #   a text widget reading it never sees it empty or half written
+        self.scheduler.schedule("question_file", clock() + max(duration_in_seconds, 1))
+        line = line or ""
+        if line == self.current_question_file_text:
+            return
+        try:
+            write_file_atomically(self.current_question_file, to_bytes(line), sync=False)
+            self.current_question_file_text = line
+        except (IOError, OSError) as e:
+            # Try again on the next update
+            self.current_question_file_text = None
+            log("UpdateCurrentQuestionFile: Unable to write the current question file: " + str(e),
+                LoggingLevel.str_to_int.get("Warn"))
+
+    def could_be_answer(self, message):
+        # Returns False if the message cannot be an answer to the current question, or there is no current question
+        return self.current_question_id != -1 and self.answer_matcher.could_match(message)
+
+    def update_detected_game(self):
+        if not self.announce_detected_game and (not self.settings.enable_game_detection
+                                                or self.game_detection_override):
+            return
+        if self.settings.twitch_channel_name == "":
+            return
+
+        if self.game_detector.update() and self.announce_detected_game:
+            self.announce_detected_game = False
+            if self.game_detector.game is None:
+                self.post("Game detection failed. Try again later.")
+            else:
+                self.post("Game detected as " + str(self.game_detector.game) + ".")
+        self.game_detector.refresh()
+
+        # Only switch question sets between questions, so a running question is not cut short
+        if self.game_detector.game is not None and not self.game_detector.game == self.current_game \
+                and self.current_question_id == -1:
+            self.current_game = self.game_detector.game
+            log("Tick: Game change detected. New game is " + str(self.current_game) + ". Loading new question set.",
+                LoggingLevel.str_to_int.get("Info"))
+            self.load_trivia()
@@ -0,0 +1,445 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# pylint: disable=invalid-name
+"""Offline simulator and benchmarks for the Trivia script.
+
+The Chatbot normally supplies the global Parent object and calls Init, Execute and Tick. This file stands in
+for it: MockParent answers every Parent call locally, VirtualClock replaces the script's clock, and ChatReplay
+feeds recorded or synthetic chat into Execute while ticking the script. Everything runs in a temporary folder,
+so the script's own questions and settings are never touched.
+
+Usage:
+    python trivia_simulator.py                          Run every benchmark
+    python trivia_simulator.py match parse              Run only the named benchmarks
+    python trivia_simulator.py --sizes 1000,10000       Question bank sizes for the save, load and memory benchmarks
+    python trivia_simulator.py --replay chat.jsonl      Replay a recorded chat log instead of benchmarking
+    python trivia_simulator.py --output results.json    Save the results, to use as a baseline later
+    python trivia_simulator.py --baseline results.json  Fail if any result is more than 25% worse than the baseline
+
+Recorded chat logs hold one JSON object per line, with the keys Time (seconds from the start), User, UserName
+and Message. User and UserName are optional.
+
+This file is not loaded by the Chatbot, which only loads files ending in _StreamlabsSystem.py.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    from importlib import reload
+except ImportError:
+    pass  # Python 2 has reload built in
+
+try:
+    import tracemalloc  # Used by the memory benchmark, where available
+except ImportError:
+    tracemalloc = None
+
+import trivia_StreamlabsSystem as trivia
+
+timer = getattr(time, "perf_counter", time.time)  # Most precise timer available
+
+# Files the script reads and writes, redirected into the simulator's folder
+script_files = {
+    "settings_file": "settings.json",
+    "questions_file": "questions.json",
+    "questions_journal_file": "questions.journal",
+    "questions_index_file": "questions.index",
+    "question_deck_file": "questions.deck",
+    "log_file": "trivialog.txt",
+    "current_question_file": "currentquestion.txt",
+    "rewards_ledger_file": "rewards.ledger",
+    "perf_report_file": "perf.json",
+}
+
+# Benchmarks where a larger result is better. Every other result is a time or size, where smaller is better.
+higher_is_better = ("messages_per_second",)
+
+
+# ---------------------------------------
+# Classes
+# ---------------------------------------
+class MockParent(object):
+    # Answers the Parent calls the script makes, and counts them. Messages and log lines are kept so that
+    #   a simulation can be checked afterwards.
+    def __init__(self, seed=0, live=True, game="Simulated Game", permissions=None, bulk_payouts=True):
+        self.random = random.Random(seed)
+        self.live = live
+        self.game = game  # Returned by GetRequest, as the game of any channel
+        self.permissions = permissions  # Set of (user, permission) pairs allowed, or None to allow everything
+        self.points = {}  # User ID: points given by the script
+        self.messages = []
+        self.logs = []
+        self.calls = {}
+        if bulk_payouts:
+            # The script only pays in bulk if Parent has AddPointsAll
+            self.AddPointsAll = self.add_points_all
+
+    def count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def IsLive(self):
+        self.count("IsLive")
+        return self.live
+
+    def HasPermission(self, user, permission, info):
+        self.count("HasPermission")
+        return self.permissions is None or (user, permission) in self.permissions
+
+    def AddPoints(self, user, username, amount):
+        self.count("AddPoints")
+        self.points[user] = self.points.get(user, 0) + amount
+        return True
+
+    def add_points_all(self, data):
+        self.count("AddPointsAll")
+        for user, amount in data.items():
+            self.points[user] = self.points.get(user, 0) + amount
+        return []
+
+    def GetRandom(self, minimum, maximum):
+        self.count("GetRandom")
+        return self.random.randrange(minimum, maximum) if maximum > minimum else minimum
+
+    def GetRequest(self, url, headers):
+        self.count("GetRequest")
+        return json.dumps({"status": 200, "response": self.game})
+
+    def GetCurrencyName(self):
+        self.count("GetCurrencyName")
+        return "points"
+
+    def SendStreamMessage(self, message):
+        self.count("SendStreamMessage")
+        self.messages.append(message)
+
+    def Log(self, script_name, message):
+        self.count("Log")
+        self.logs.append(message)
+
+
+class VirtualClock(object):
+    # Stands in for time.time as the script's clock, so simulated time only moves when told to
+    def __init__(self, start=1000000000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now = self.now + seconds
+
+
+class ChatMessage(object):
+    # The parts of the Chatbot's message data that the script uses
+    def __init__(self, user, username, message):
+        self.User = user
+        self.UserName = username
+        self.Message = message
+        self.RawData = "@badge-info=;user-id=" + user + "; :" + username + " PRIVMSG #channel :" + message
+        self.params = message.split(" ")
+
+    def IsChatMessage(self):
+        return True
+
+    def GetParamCount(self):
+        return len(self.params)
+
+    def GetParam(self, index):
+        return self.params[index] if index < len(self.params) else ""
+
+
+class ChatReplay(object):
+    # Feeds chat into Execute at the times given, ticking the script in between like the Chatbot does
+    def __init__(self, clock, tick_interval=0.1):
+        self.clock = clock
+        self.tick_interval = tick_interval
+        self.elapsed = 0.0
+        self.message_count = 0
+        self.tick_count = 0
+
+    def run_until(self, elapsed):
+        while self.elapsed + self.tick_interval <= elapsed:
+            self.elapsed = self.elapsed + self.tick_interval
+            self.clock.advance(self.tick_interval)
+            trivia.Tick()
+            self.tick_count = self.tick_count + 1
+
+    def replay(self, messages):
+        # messages holds (seconds from the start, user ID, username, message text), in time order
+        for elapsed, user, username, message in messages:
+            self.run_until(elapsed)
+            trivia.Execute(ChatMessage(user, username, message))
+            self.message_count = self.message_count + 1
+
+
+# ---------------------------------------
+# Functions
+# ---------------------------------------
+def start_script(directory, question_count=100, settings=None, parent=None, clock=None, init=True):
+    # Reloads the script so no state is left from an earlier run, points it at the simulator's folder and files,
+    #   writes its settings and questions, then runs Init
+    reload(trivia)
+    for name, file_name in script_files.items():
+        setattr(trivia, name, os.path.join(directory, file_name))
+        if os.path.exists(getattr(trivia, name)):
+            os.remove(getattr(trivia, name))
+    trivia.Parent = parent or MockParent()
+    trivia.clock = clock or VirtualClock()
+    with open(trivia.settings_file, "wb") as settings_file:
+        settings_file.write(json.dumps(dict({"debug_level": "Nothing"}, **(settings or {}))).encode("utf-8"))
+    write_question_bank(trivia.questions_file, question_count)
+    if init:
+        trivia.Init()
+    return trivia.Parent, trivia.clock
+
+
+def write_question_bank(file_path, question_count, games=20):
+    questions = [{"ID": number + 1, "Points": 10, "Game": "Game " + str(number % games),
+                  "Question": "What is the answer to question " + str(number + 1) + "?",
+                  "Answers": ["answer " + str(number + 1), "alternate answer " + str(number + 1)]}
+                 for number in range(question_count)]
+    with open(file_path, "wb") as questions_file:
+        questions_file.write(json.dumps(questions).encode("utf-8"))
+
+
+def read_chat_log(file_path):
+    # Reads a recorded chat log, one JSON object per line
+    messages = []
+    with io.open(file_path, encoding="utf-8") as chat_log:
+        for line in chat_log:
+            if line.strip():
+                record = json.loads(line)
+                user = str(record.get("User") or record.get("UserName") or "viewer")
+                messages.append((float(record["Time"]), user, record.get("UserName") or user, record["Message"]))
+    return messages
+
+
+def synthetic_chat(count, duration, answers, user_count=500, answer_rate=0.05, seed=0):
+    # Busy chat: mostly unrelated messages of varied length, with some guesses and the odd correct answer
+    generator = random.Random(seed)
+    words = ["lol", "pog", "nice", "what", "is", "this", "game", "gg", "hello", "chat", "kappa", "no", "way"]
+    messages = []
+    for number in range(count):
+        user = str(generator.randrange(user_count))
+        roll = generator.random()
+        if roll < answer_rate:
+            text = generator.choice(answers)
+        elif roll < answer_rate * 4:
+            text = "answer " + str(generator.randrange(1000))
+        else:
+            text = " ".join(generator.choice(words) for _ in range(generator.randrange(1, 12)))
+        messages.append((duration * number / float(count), user, "viewer" + user, text))
+    return messages
+
+
+def measure(function, repeat=5):
+    # Returns the fastest of several runs, which is the least affected by other work on the machine
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = timer()
+        function()
+        elapsed = timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_match(directory, sizes):
+    # Chat throughput while a question is running, through Execute and through check_for_match alone
+    start_script(directory, settings={"number_of_winners": 0, "duration_of_questions": 60})
+    game = trivia.default_game
+    game.next_question()
+    question = game.get_current_question()
+    messages = [ChatMessage(user, username, text) for elapsed, user, username, text
+                in synthetic_chat(20000, 60, list(question.get_answers()))]
+
+    def execute_all():
+        game.correct_users_dict.clear()
+        for message in messages:
+            trivia.Execute(message)
+
+    def match_all():
+        game.correct_users_dict.clear()
+        for message in messages:
+            game.check_for_match(message)
+
+    results = {"execute.messages_per_second": len(messages) / measure(execute_all),
+               "check_for_match.messages_per_second": len(messages) / measure(match_all)}
+
+    # The same again with tolerant matching and typo tolerance, which do the most work per message
+    game.settings.enable_tolerant_matching = True
+    game.settings.answer_typo_tolerance = 2
+    game.answer_matcher = game.create_answer_matcher(question)
+    results["check_for_match_tolerant.messages_per_second"] = len(messages) / measure(match_all)
+    return results
+
+
+def benchmark_parse(directory, sizes):
+    # Cost of filling in each message string for the current question
+    start_script(directory)
+    trivia.default_game.next_question()
+    winners = ["viewer" + str(number) for number in range(5)]
+    results = {}
+    for setting_name in trivia.message_template_settings:
+        seconds = measure(lambda: [trivia.default_game.parse_string(setting_name, winners) for _ in range(10000)])
+        results["parse_string." + setting_name + ".microseconds"] = seconds / 10000 * 1000000
+    return results
+
+
+def benchmark_tick(directory, sizes):
+    # Cost of a Tick with nothing due, during a question and between questions
+    results = {}
+    for name, settings in (("tick", {}), ("tick_file_mode", {"create_current_question_file": True})):
+        start_script(directory, settings=dict({"duration_of_questions": 600}, **settings))
+        trivia.default_game.next_question()
+        results[name + ".question.microseconds"] = measure(lambda: [trivia.Tick() for _ in range(100000)]) * 10
+        trivia.default_game.end_question()
+        results[name + ".cooldown.microseconds"] = measure(lambda: [trivia.Tick() for _ in range(100000)]) * 10
+    return results
+
+
+def benchmark_games(directory, sizes):
+    # Cost of a Tick running several games, each with its own channel, that share one question bank
+    results = {}
+    for count in (1, 10, 100):
+        start_script(directory, settings={"duration_of_questions": 600})
+        for number in range(1, count):
+            game_directory = os.path.join(directory, "channel" + str(number))
+            if not os.path.isdir(game_directory):
+                os.mkdir(game_directory)
+            for file_name in ("settings.json", "rewards.ledger"):
+                if os.path.exists(os.path.join(game_directory, file_name)):
+                    os.remove(os.path.join(game_directory, file_name))
+            shutil.copyfile(trivia.settings_file, os.path.join(game_directory, "settings.json"))
+            trivia.add_trivia_game(MockParent(seed=number), game_directory)
+        for game in trivia.trivia_games:
+            game.next_question()
+        results["tick_games." + str(count) + ".microseconds"] = \
+            measure(lambda: [trivia.Tick() for _ in range(10000)]) * 100
+    return results
+
+
+def benchmark_save_load(directory, sizes):
+    # Time to write and read question banks of each size
+    results = {}
+    for size in sizes:
+        start_script(directory, question_count=size)
+        results["save_trivia." + str(size) + ".seconds"] = measure(trivia.save_trivia, repeat=3)
+
+        # Each load needs a freshly started script, so loads are timed here rather than with measure
+        saved_questions = os.path.join(directory, "saved_questions.json")
+        shutil.copyfile(trivia.questions_file, saved_questions)
+        load_times = []
+        for _ in range(3):
+            start_script(directory, question_count=0, init=False)
+            shutil.copyfile(saved_questions, trivia.questions_file)
+            gc.collect()
+            start = timer()
+            trivia.Init()
+            load_times.append(timer() - start)
+        results["load_trivia." + str(size) + ".seconds"] = min(load_times)
+    return results
+
+
+def benchmark_memory(directory, sizes):
+    # Memory held by loaded question banks of each size
+    if tracemalloc is None:
+        return {}
+    results = {}
+    for size in sizes:
+        start_script(directory, question_count=size, init=False)
+        gc.collect()
+        tracemalloc.start()
+        trivia.Init()
+        gc.collect()
+        results["memory." + str(size) + ".megabytes"] = tracemalloc.get_traced_memory()[0] / 1048576.0
+        tracemalloc.stop()
+    return results
+
+
+benchmarks = {
+    "match": benchmark_match,
+    "parse": benchmark_parse,
+    "tick": benchmark_tick,
+    "games": benchmark_games,
+    "saveload": benchmark_save_load,
+    "memory": benchmark_memory,
+}
+
+
+def replay_chat_log(directory, file_path):
+    messages = read_chat_log(file_path)
+    parent, clock = start_script(directory, settings={"cooldown_between_questions": 1})
+    driver = ChatReplay(clock)
+    start = timer()
+    driver.replay(messages)
+    elapsed = timer() - start
+    print("Replayed " + str(driver.message_count) + " messages and " + str(driver.tick_count) + " ticks in "
+          + str(round(elapsed, 3)) + " seconds.")
+    print("Chat messages sent: " + str(len(parent.messages)) + ". Points given: " + str(sum(parent.points.values()))
+          + ". Parent calls: " + json.dumps(parent.calls, sort_keys=True))
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    # Returns the names of results that are worse than the baseline by more than the tolerance
+    regressions = []
+    for name, value in sorted(results.items()):
+        if name not in baseline or not baseline[name]:
+            continue
+        if name.endswith(higher_is_better):
+            change = (baseline[name] - value) / baseline[name]
+        else:
+            change = (value - baseline[name]) / baseline[name]
+        if change > tolerance:
+            regressions.append(name)
+            print("REGRESSION " + name + ": " + str(round(value, 4)) + " against " + str(round(baseline[name], 4)))
+    return regressions
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Simulate and benchmark the Trivia script offline.")
+    parser.add_argument("benchmarks", nargs="*", help="Benchmarks to run: " + ", ".join(sorted(benchmarks)))
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated question bank sizes")
+    parser.add_argument("--replay", help="Replay a recorded chat log instead of benchmarking")
+    parser.add_argument("--output", help="Save the results to this file")
+    parser.add_argument("--baseline", help="Compare the results with a file saved by --output")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline")
+    options = parser.parse_args(arguments)
+
+    directory = tempfile.mkdtemp(prefix="trivia_simulator_")
+    try:
+        if options.replay:
+            replay_chat_log(directory, options.replay)
+            return 0
+
+        sizes = [int(size) for size in options.sizes.split(",") if size]
+        results = {}
+        for name in options.benchmarks or sorted(benchmarks):
+            if name not in benchmarks:
+                parser.error("Unknown benchmark " + name)
+            for result_name, value in sorted(benchmarks[name](directory, sizes).items()):
+                print(result_name.ljust(70) + str(round(value, 4)))
+                results[result_name] = value
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if options.output:
+        with open(options.output, "w") as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+    if options.baseline:
+        with open(options.baseline) as baseline_file:
+            if compare_to_baseline(results, json.load(baseline_file), options.tolerance):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))